@@ -1,4 +1,5 @@
 """Implementation of the 'bundle' subcommand."""
+import copy
 import csv
 import gzip
 import io
@@ -10,6 +11,8 @@ import re
 import shutil
 import subprocess
 import sys
+import tempfile
+from functools import lru_cache
 from glob import glob
 from os.path import basename, isdir, isfile, join, splitext
 from typing import List, Tuple
@@ -21,20 +24,22 @@ from pyparsing import ParseException
 from rdflib import Graph, Literal
 from rdflib.namespace import OWL, RDFS, SKOS, XSD, Namespace
 from rdflib.plugins.sparql import prepareQuery
-from rdflib.util import guess_format
 from SPARQLWrapper import TURTLE
 
 from .mdutils import md2html
 from .ontograph import OntoGraf
 from .sparql_utils import create_endpoint, select_query_csv
 from .utils import parse_rdf, find_single_ontology, perform_export, \
-                   add_defined_by
+                   add_defined_by, guess_rdf_format
 
 # f-strings are fine in log messages
 # pylint: disable=W1203
 # CamelCase variable names are fine
 # pylint: disable=C0103
 
+# libyaml-backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class BundleFileException(Exception):
     """Thrown for invalid options in a bundle file not caught by schema."""
@@ -68,11 +73,25 @@ def register(name):
 
 
 def replace_patterns_in_file(file, from_pattern, to_string):
-    """Replace regex pattern in file contents."""
+    """Replace regex pattern in file contents.
+
+    The file is only rewritten if the pattern matched, via a temporary file in
+    the same directory so an interrupted write cannot truncate it.
+    """
     with open(file, 'r') as f:
-        replaced = re.compile(from_pattern).sub(to_string, f.read())
-    with open(file, 'w') as f:
-        f.write(replaced)
+        replaced, count = re.compile(from_pattern).subn(to_string, f.read())
+    if not count:
+        return
+    f = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(file) or '.',
+                                    suffix='.tmp', delete=False)
+    try:
+        with f:
+            f.write(replaced)
+        shutil.copymode(file, f.name)
+        os.replace(f.name, file)
+    except BaseException:
+        os.unlink(f.name)
+        raise
 
 
 def __bundle_file_list(action, variables, ignore_target=False):
@@ -117,6 +136,10 @@ def __bundle_file_list(action, variables, ignore_target=False):
         if 'excludes' in action:
             excluded_files = set(itertools.chain.from_iterable(
                 glob(os.path.join(src_dir, pattern)) for pattern in action['excludes']))
+        if 'rename' in action and not ignore_target:
+            from_pattern = re.compile(
+                action['rename']['from'].format(**variables))
+            to_pattern = action['rename']['to'].format(**variables)
         for pattern in include_pattern:
             matches = list(glob(os.path.join(src_dir, pattern)))
             if not matches and not any(wildcard in pattern for wildcard in '[]*?'):
@@ -126,9 +149,6 @@ def __bundle_file_list(action, variables, ignore_target=False):
                     output_file = None
                 else:
                     if 'rename' in action:
-                        from_pattern = re.compile(
-                            action['rename']['from'].format(**variables))
-                        to_pattern = action['rename']['to'].format(**variables)
                         output_file = from_pattern.sub(
                             to_pattern,
                             os.path.basename(input_file))
@@ -179,27 +199,30 @@ def __bundle_transform_sparql__(action, tool, variables):
 
     parsed_query = __parse_update_query__(query_text)
 
+    # Same for every file in the action
+    output_format = None
+    if 'format' in tool:
+        output_format = 'pretty-xml' if action['format'] == 'xml' else action['format']
+    replace = None
+    if 'replace' in action:
+        replace = (action['replace']['from'].format(**variables),
+                   action['replace']['to'].format(**variables))
+
     for in_out in __bundle_file_list(action, variables):
         g = Graph()
         onto_file = in_out['inputFile']
-        rdf_format = guess_format(onto_file)
+        rdf_format = guess_rdf_format(onto_file)
         parse_rdf(g, onto_file, rdf_format=rdf_format)
 
         g.update(
             parsed_query,
             initNs={'xsd': XSD, 'owl': OWL, 'rdfs': RDFS, 'skos': SKOS})
 
-        if 'format' in tool:
-            rdf_format = 'pretty-xml' if action['format'] == 'xml' else action['format']
-
         g.serialize(destination=in_out['outputFile'],
-                    format=rdf_format, encoding='utf-8')
+                    format=output_format or rdf_format, encoding='utf-8')
 
-        if 'replace' in action:
-            replace_patterns_in_file(in_out['outputFile'],
-                                     action['replace']['from'].format(
-                                         **variables),
-                                     action['replace']['to'].format(**variables))
+        if replace:
+            replace_patterns_in_file(in_out['outputFile'], *replace)
 
 
 def __parse_update_query__(query_text):
@@ -233,7 +256,7 @@ def __bundle_defined_by__(action, variables):
     for in_out in __bundle_file_list(action, variables):
         g = Graph()
         onto_file = in_out['inputFile']
-        rdf_format = guess_format(onto_file)
+        rdf_format = guess_rdf_format(onto_file)
         parse_rdf(g, onto_file, rdf_format)
 
         # locate ontology
@@ -291,7 +314,6 @@ def __bundle_move__(action, variables):
 
 @register(name="markdown")
 def __bundle_markdown__(action, variables):
-    logging.debug('Markdown %s', action)
     logging.debug('Markdown %s', action)
     # The default rename is *.md -> *.html
     if 'rename' not in action:
@@ -300,8 +322,7 @@ def __bundle_markdown__(action, variables):
         with open(in_out['inputFile']) as md:
             converted_md = md2html(md.read())
         with open(in_out['outputFile'], 'w') as fd:
-            converted_md.seek(0)
-            shutil.copyfileobj(converted_md, fd, -1)
+            fd.write(converted_md.getvalue())
 
 
 @register(name="graph")
@@ -320,24 +341,29 @@ def __bundle_graph__(action, variables):
 
 
 def __bundle_local_sparql_each__(action, variables, queries):
+    # Parse each query once, rather than once per input file
+    parsed_queries = []
+    for query_file, query_text in queries:
+        parsed_update = None
+        parsed_query = None
+        try:
+            parsed_update = __parse_update_query__(query_text)
+        except ParseException:
+            # Not a update
+            parsed_query = prepareQuery(query_text)
+        parsed_queries.append((query_file, query_text, parsed_update, parsed_query))
+
     for in_out in __bundle_file_list(action, variables):
         g = Graph()
         onto_file = in_out['inputFile']
         parse_rdf(g, onto_file)
-        logging.debug("Input graph size for %s is %d",
-                      in_out['inputFile'], len(g))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Input graph size for %s is %d",
+                          in_out['inputFile'], len(g))
 
         updated = False
-        for query_file, query_text in queries:
+        for query_file, query_text, parsed_update, parsed_query in parsed_queries:
             logging.debug("Applying %s to %s", query_file, in_out['inputFile'])
-            parsed_update = None
-            parsed_query = None
-            try:
-                parsed_update = __parse_update_query__(query_text)
-            except ParseException:
-                # Not a update
-                parsed_query = prepareQuery(query_text)
-
             if parsed_update:
                 g.update(parsed_update)
                 __transfer_query_prefixes__(g, parsed_update)
@@ -515,7 +541,27 @@ def __build_graph_from_inputs__(action, variables):
     for in_out in __bundle_file_list(action, variables, ignore_target=True):
         onto_file = in_out['inputFile']
         parse_rdf(g, onto_file)
-    logging.debug("Input graph size is %d", len(g))
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Input graph size is %d", len(g))
+    return g
+
+
+@lru_cache(maxsize=16)
+def __shapes_data__(files_and_mtimes):
+    """Parse SHACL shape files into (namespaces, triples), cached until any of them changes."""
+    g = Graph()
+    for onto_file, _ in files_and_mtimes:
+        parse_rdf(g, onto_file)
+    return tuple(g.namespaces()), tuple(g)
+
+
+def __shapes_graph__(files_and_mtimes):
+    """Build a new Graph from the cached shapes, so validation runs cannot affect each other."""
+    namespaces, triples = __shapes_data__(files_and_mtimes)
+    g = Graph()
+    for prefix, namespace in namespaces:
+        g.bind(prefix, namespace)
+    g.addN((s, p, o, g) for s, p, o in triples)
     return g
 
 
@@ -695,10 +741,16 @@ def __process_construct_validation__(output, fail_on_warning, stop_on_fail,
 
 def __verify_shacl__(action, variables):
     data_graph = __build_graph_from_inputs__(action, variables)
-    shape_graph = __build_graph_from_inputs__(action['shapes'], variables)
+    # Shape files are parsed once while unchanged, each run gets its own Graph
+    shape_graph = __shapes_graph__(tuple(
+        (in_out['inputFile'], os.stat(in_out['inputFile']).st_mtime_ns)
+        for in_out in __bundle_file_list(action['shapes'], variables, ignore_target=True)))
 
-    logging.debug("Data graph has %s triples", sum(1 for _ in data_graph))
-    logging.debug("Shape graph has %s triples", sum(1 for _ in shape_graph))
+    # Counting triples walks the whole graph, only do it when it will be logged
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    if debug:
+        logging.debug("Data graph has %s triples", sum(1 for _ in data_graph))
+        logging.debug("Shape graph has %s triples", sum(1 for _ in shape_graph))
 
     conforms, results_graph, _ = \
         pyshacl.validate(
@@ -707,8 +759,9 @@ def __verify_shacl__(action, variables):
             abort_on_first=False, meta_shacl=False,
             advanced=True, js=False, debug=False)
 
-    logging.debug("Post-inference data graph has %s triples",
-                  sum(1 for _ in data_graph))
+    if debug:
+        logging.debug("Post-inference data graph has %s triples",
+                      sum(1 for _ in data_graph))
 
     if not conforms:
         if 'target' in action:
@@ -902,6 +955,32 @@ def __create_output(compressed, filename):
     return open(filename, 'w', encoding="utf-8")
 
 
+@lru_cache(maxsize=None)
+def __bundle_schema__():
+    """Load the bundle JSON schema once per process; it is never modified."""
+    schema_file = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        'bundle_schema.yaml')
+    with open(schema_file, 'r', encoding="utf-8") as schema:
+        return yaml.load(schema, Loader=_YAML_LOADER)
+
+
+@lru_cache(maxsize=128)
+def __load_bundle__(bundle_path, mtime_ns):
+    """Parse and validate a bundle definition, cached until the file changes."""
+    extension = os.path.splitext(bundle_path)[1]
+    with open(bundle_path, 'r', encoding="utf-8") as b_stream:
+        if extension == '.yaml':
+            bundle = yaml.load(b_stream, Loader=_YAML_LOADER)
+        else:
+            # assume json regardless of extension
+            bundle = json.load(b_stream)
+
+    # will throw ValidationError on failure
+    validate(bundle, __bundle_schema__())
+    return bundle
+
+
 def bundle_ontology(command_line_variables, bundle_path):
     """
     Bundle ontology and related artifacts for release.
@@ -918,20 +997,8 @@ def bundle_ontology(command_line_variables, bundle_path):
     None.
 
     """
-    extension = os.path.splitext(bundle_path)[1]
-    schema_file = os.path.join(
-        os.path.dirname(os.path.realpath(__file__)),
-        'bundle_schema.yaml')
-    with open(bundle_path, 'r', encoding="utf-8") as b_stream, \
-            open(schema_file, 'r', encoding="utf-8") as schema:
-        if extension == '.yaml':
-            bundle = yaml.safe_load(b_stream)
-        else:
-            # assume json regardless of extension
-            bundle = json.load(b_stream)
-
-        # will throw ValidationError on failure
-        validate(bundle, yaml.safe_load(schema))
+    # Actions fill in defaults as they run, so work on a copy of the cached bundle
+    bundle = copy.deepcopy(__load_bundle__(bundle_path, os.stat(bundle_path).st_mtime_ns))
 
     variables = VarDict()
     variables.update(bundle['variables'])
@@ -2,10 +2,13 @@
 import argparse
 import os
 import re
-import sys
+from functools import lru_cache
 from urllib.parse import urlparse
 from rdflib import URIRef
 
+# Semantic version accepted for --merge
+_MERGE_VERSION_RE = re.compile(r'\d+(\.\d+){0,2}')
+
 
 def _uri_validator(x):
     """Check for valid URI."""
@@ -53,13 +56,19 @@ class OntologyUriValidator(argparse.Action):
             iri = URIRef(values[0])
         else:
             parser.error(f'Invalid merge ontology URI {values[0]}')
-        if not re.match(r'\d+(\.\d+){0,2}', values[1]):
+        if not _MERGE_VERSION_RE.match(values[1]):
             parser.error(f'Invalid merge ontology version {values[1]}')
         setattr(namespace, self.dest, [iri, values[1]])
 
 
+@lru_cache(maxsize=1)
 def configure_arg_parser():
-    """Configure command line parser."""
+    """Configure command line parser.
+
+    The parser is built once and reused, so defaults must not capture
+    process state: the stdout and output directory defaults are resolved
+    when arguments are parsed.
+    """
     parser = argparse.ArgumentParser(description='Ontology toolkit.')
     parser.add_argument('-k', '--insecure', action="store_true",
                         help="Allow insecure server connections when using SSL")
@@ -117,7 +126,7 @@ def define_graphic_parser(subparsers):
     graphic_parser.add_argument('--save-cache', type=argparse.FileType("w", encoding="utf-8"),
                                 help="Persist query results, which can be used with '--cache'")
     graphic_parser.add_argument('-o', '--output', action="store",
-                                default=os.getcwd(),
+                                default=os.curdir,
                                 help="Output directory for generated graphics")
     graphic_parser.add_argument(
         '--show-shacl', action="store_true",
@@ -200,6 +209,14 @@ def define_graphic_parser(subparsers):
                                 help="Ontology file, directory or name pattern")
     graphic_parser.add_argument("--show-bnode-subjects", action="store_true",
                                 help="Include blank node subjects when generating a graph.")
+    graphic_parser.add_argument("--nt-cache", action="store_true",
+                                help="Save an N-Triples copy of each local input file in"
+                                " .ontograf-nt-cache in the output directory, and parse that"
+                                " on later runs while it is up to date.")
+    graphic_parser.add_argument("--schema-cache", action="store_true",
+                                help="Read and write .ontograf-cache.json in the output"
+                                " directory, which lets schema graphics skip re-parsing"
+                                " unchanged files.")
 
 
 def define_export_parser(subparsers):
@@ -218,7 +235,7 @@ def define_export_parser(subparsers):
                                help="Emit verbose debug output")
     export_parser.add_argument('-o', '--output',
                                type=argparse.FileType('w', encoding='utf-8'),
-                               default=sys.stdout,
+                               default='-',
                                help='Path to output file.')
     export_parser.add_argument('-s', '--strip-versions', action="store_true",
                                help='Remove versions from imports.')
@@ -240,6 +257,10 @@ def define_export_parser(subparsers):
                                'of rdfs:isDefinedBy')
     export_parser.add_argument('--versioned-definedBy', action="store_true",
                                help='Use versionIRI for rdfs:isDefinedBy, when available')
+    export_parser.add_argument('-S', '--store', action="store",
+                               help='Hold the combined graph in the named rdflib store '
+                               '(e.g. BerkeleyDB, or Oxigraph if oxrdflib is installed) '
+                               'backed by a temporary directory, instead of in memory.')
     export_parser.add_argument('ontology', nargs="*", default=[],
                                help="Ontology file or directory containing OWL files")
 
@@ -262,7 +283,7 @@ def define_update_parser(subparsers):
                                help="Emit verbose debug output")
     update_parser.add_argument('-o', '--output',
                                type=argparse.FileType('w', encoding='utf-8'),
-                               default=sys.stdout,
+                               default='-',
                                help='Path to output file. Will be ignored if '
                                '--in-place is specified.')
     update_parser.add_argument('-b', '--defined-by', action="store",
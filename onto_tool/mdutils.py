@@ -40,6 +40,9 @@ _TEMPLATE = """<!DOCTYPE html>
 </html>
 """
 
+# Compiled once, rendered for every converted file
+_HTML_TEMPLATE = jinja2.Template(_TEMPLATE)
+
 
 def md2html(md):
     """
@@ -50,6 +53,6 @@ def md2html(md):
     """
     extensions = ['extra', 'smarty', 'tables']
     html = markdown2.markdown(md, extras=extensions)
-    doc = jinja2.Template(_TEMPLATE).render(content=html)
+    doc = _HTML_TEMPLATE.render(content=html)
     docfile = io.StringIO(doc)
     return docfile
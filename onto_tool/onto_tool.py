@@ -2,13 +2,11 @@
 import logging
 import re
 import shutil
-import subprocess
 import sys
-from os.path import basename, join, splitext
+from functools import lru_cache
 
-from rdflib import Graph, Literal, URIRef
+from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
 from rdflib.namespace import OWL, XSD
-from rdflib.util import guess_format
 
 import onto_tool
 
@@ -16,7 +14,8 @@ from .bundle import bundle_ontology
 from .command_line import configure_arg_parser
 from .ontograph import OntoGraf
 from .utils import isfile, expand_file_ref, perform_export, find_single_ontology, \
-                   add_defined_by, parse_rdf, strip_versions
+                   add_defined_by, build_export_graph, guess_rdf_format, \
+                   load_rdf_graph, serialize_to_stream, strip_versions
 
 
 # f-strings are fine in log messages
@@ -24,6 +23,21 @@ from .utils import isfile, expand_file_ref, perform_export, find_single_ontology
 # CamelCase variable names are fine
 # pylint: disable=C0103
 
+# Trailing numeric version of a versionIRI
+_VERSION_TAIL_RE = re.compile(r'\d+\.\d+\.\d+$')
+
+
+def _version_base(iri):
+    """Return iri without its trailing numeric version, if any."""
+    match = _VERSION_TAIL_RE.search(iri)
+    return iri[:match.start()] if match else iri
+
+
+@lru_cache(maxsize=None)
+def _dependency_pattern(dep):
+    """Compile the pattern matching a (possibly versioned) import of dep."""
+    return re.compile(re.escape(dep) + r'(\d+\.\d+\.\d+)?')
+
 
 def set_version(g, ontology, ontology_iri, version):
     """Add or replace versionIRI for the specified ontology."""
@@ -43,9 +57,9 @@ def set_version_info(g, ontology, version_info):
     If versionInfo is not provided, extracts ontology version from versionIRI.
     """
     version_info = version_info if version_info != 'auto' else None
-    pattern = re.compile('^(.*?)(\\d+\\.\\d+\\.\\d+)?$')
     version_iri = next(g.objects(ontology, OWL.versionIRI), None)
-    version = pattern.match(str(version_iri)).group(2) if version_iri else None
+    match = _VERSION_TAIL_RE.search(str(version_iri)) if version_iri else None
+    version = match.group() if match else None
     if not version and not version_info:
         raise LookupError(
             f'No version found for {ontology}, must specify version info')
@@ -69,12 +83,16 @@ def update_dependency_versions(g, ontology, versions):
     (ignoring version) any of the ontology provided in the argument,
     update them to the new version.
     """
-    # Gather current dependencies
-    current_deps = g.objects(ontology, OWL.imports)
+    # Gather current dependencies, indexed by their unversioned IRI
+    current_deps = list(g.objects(ontology, OWL.imports))
+    deps_by_base = {_version_base(str(c)): c for c in current_deps}
     for dv in versions:
         dep, ver = dv
-        pattern = re.compile(f'{dep}(\\d+\\.\\d+\\.\\d+)?')
-        match = next((c for c in current_deps if pattern.search(str(c))), None)
+        pattern = _dependency_pattern(dep)
+        match = deps_by_base.get(dep)
+        if match is None:
+            # Plain substring test first, the regex only runs on candidates
+            match = next((c for c in current_deps if dep in c and pattern.search(c)), None)
         if match:
             # Updating current dependency
             current = pattern.search(str(match)).group(1)
@@ -85,6 +103,8 @@ def update_dependency_versions(g, ontology, versions):
                 logging.debug(f'Removing unversioned depenendency for {dep}')
                 new_version_uri = URIRef(f'{str(match)}{ver}')
             g.remove((ontology, OWL.imports, match))
+            current_deps.remove(match)
+            deps_by_base.pop(_version_base(str(match)), None)
 
             g.add((ontology, OWL.imports, new_version_uri))
             logging.info(f'Updated dependency to {new_version_uri}')
@@ -93,24 +113,8 @@ def update_dependency_versions(g, ontology, versions):
             new_version_uri = URIRef(f'{dep}{ver}')
             g.add((ontology, OWL.imports, new_version_uri))
             logging.info(f'Added dependency for {new_version_uri}')
-
-
-def serialize_to_output_dir(tools, output, version, file):
-    """Serialize ontology file using standard options."""
-    base, ext = splitext(basename(file))
-    output_file = join(output, f"{base}{version}{ext}")
-    logging.debug(f"Serializing {file} to {output}")
-    serialize_args = [
-        "java",
-        "-jar", join(tools, "rdf-toolkit.jar"),
-        "-tfmt", "rdf-xml",
-        "-sdt", "explicit",
-        "-dtd",
-        "-ibn",
-        "-s", file,
-        "-t", output_file]
-    subprocess.run(serialize_args, check=True)
-    return output_file
+        current_deps.append(new_version_uri)
+        deps_by_base[_version_base(str(new_version_uri))] = new_version_uri
 
 
 def copy_if_present(from_loc, to_loc):
@@ -171,10 +175,19 @@ def generate_graphic(action, onto_files, endpoint, **kwargs):
         Save query results as JSON to use with --cache
     show_bnode_subjects: boolean
         If true, triples with blank nodes in the subject will not be used to filtered out.
+    nt_cache: boolean
+        If true, parse local files via N-Triples copies kept in .ontograf-nt-cache
+        next to the graphic output, creating or refreshing them when out of date.
+    schema_cache: boolean
+        If true, reuse schema data extracted from unchanged local files by previous
+        runs, saved in .ontograf-cache.json next to the graphic output.
+    write_output: boolean
+        If false, only build the graph: no .dot, .png or schema cache files are written.
 
     Returns
     -------
-    None.
+    string
+        The DOT text of the graphic, or None if an instance graphic found no data.
 
     """
     all_files = [file for ref in onto_files for file in expand_file_ref(ref)]
@@ -189,10 +202,38 @@ def generate_graphic(action, onto_files, endpoint, **kwargs):
             og.gather_schema_info_from_repo()
         else:
             og.gather_schema_info_from_files()
-        og.create_schema_graf()
-    else:
-        og.gather_instance_info()
-        og.create_instance_graf()
+        return og.create_schema_graf()
+    og.gather_instance_info()
+    return og.create_instance_graf()
+
+
+def __graphic_options(args):
+    """Collect the generate_graphic keyword parameters from parsed arguments."""
+    return dict(limit=args.instance_limit, threshold=args.predicate_threshold,
+                single_graph=args.single_ontology_graphs,
+                wee=args.wee, outpath=args.output, version=args.version,
+                no_image=args.no_image, title=args.title, hide=args.hide,
+                label_language=args.label_language,
+                concentrate_links=args.link_concentrator_threshold,
+                include=args.include, exclude=args.exclude,
+                include_pattern=args.include_pattern,
+                exclude_pattern=args.exclude_pattern,
+                show_shacl=args.show_shacl,
+                cache=args.cache,
+                save_cache=args.save_cache,
+                show_bnode_subjects=args.show_bnode_subjects,
+                nt_cache=args.nt_cache,
+                schema_cache=args.schema_cache)
+
+
+def graphic_dot(args):
+    """Build the DOT text for a graphic command without writing .dot, .png or cache files.
+
+    Takes the parsed arguments of a graphic command. Returns None if an
+    instance graphic finds no data.
+    """
+    return generate_graphic(args.action, args.ontology, args.endpoint,
+                            write_output=False, **__graphic_options(args))
 
 
 def __suppress_ssl_certificate_check():
@@ -204,31 +245,54 @@ def __suppress_ssl_certificate_check():
     ssl._create_default_https_context = ssl._create_unverified_context
 
 
-def export_ontology(args, output_format):
+def __export_options(args):
+    """Collect the perform_export/build_export_graph options from parsed arguments."""
+    return dict(
+        context=args.context if 'context' in args and args.context else None,
+        remove_dependency_versions='strip_versions' in args and args.strip_versions,
+        merge=args.merge if 'merge' in args and args.merge else None,
+        defined_by=args.defined_by if 'defined_by' in args and args.defined_by else None,
+        retain_defined_by=args.retain_definedBy,
+        versioned_defined_by=args.versioned_definedBy)
+
+
+def export_ontology(args, output_format, preloaded_graphs=None):
     """Export one or more files as a single output.
 
     Optionally, strips dependency versions and merges ontologies into
     a single new ontology.
     """
-    context = args.context if 'context' in args and args.context else None
-    defined_by = args.defined_by if 'defined_by' in args and args.defined_by else None
-
     perform_export(args.output, output_format, args.ontology,
-                   context,
-                   'strip_versions' in args and args.strip_versions,
-                   args.merge if 'merge' in args and args.merge else None,
-                   defined_by,
-                   args.retain_definedBy,
-                   args.versioned_definedBy)
+                   store=args.store, preloaded=preloaded_graphs,
+                   **__export_options(args))
 
 
-def update_ontology(args, output_format):
-    """Maintenance updates for ontology files."""
+def export_graph(args, preloaded_graphs=None):
+    """Build the combined export graph without serializing it.
+
+    Takes the parsed arguments of an export command. The graph is held in
+    memory, so --store is rejected with a ValueError. Returns None if
+    --defined-by was requested and no single ontology was found.
+    """
+    if args.store:
+        raise ValueError('export_graph builds the graph in memory, --store is not supported')
+    options = __export_options(args)
+    g = ConjunctiveGraph() if options['context'] else Graph()
+    return build_export_graph(g, args.ontology, preloaded=preloaded_graphs, **options)
+
+
+def update_graphs(args, preloaded_graphs=None):
+    """Apply maintenance updates to ontology files without writing them.
+
+    Takes the parsed arguments of an update command, and yields
+    (file, original format, updated Graph) for each file that was updated.
+    Files are parsed and updated one at a time, as the results are consumed.
+    """
     for onto_file in [file for ref in args.ontology for file in expand_file_ref(ref)]:
-        g = Graph()
-        orig_format = guess_format(onto_file)
-        parse_rdf(g, onto_file, orig_format)
-        logging.debug(f'{onto_file} has {len(g)} triples')
+        orig_format = guess_rdf_format(onto_file)
+        g = load_rdf_graph(onto_file, orig_format, preloaded_graphs)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f'{onto_file} has {len(g)} triples')
 
         # locate ontology
         ontology = find_single_ontology(g, onto_file)
@@ -262,6 +326,12 @@ def update_ontology(args, output_format):
         if 'strip_versions' in args and args.strip_versions:
             strip_versions(g, ontology)
 
+        yield onto_file, orig_format, g
+
+
+def update_ontology(args, output_format, preloaded_graphs=None):
+    """Maintenance updates for ontology files."""
+    for onto_file, orig_format, g in update_graphs(args, preloaded_graphs):
         output_updated_ontology(args, g, onto_file, orig_format, output_format)
 
 
@@ -273,12 +343,15 @@ def output_updated_ontology(args, g, onto_file, orig_format, output_format):
                     format=adjusted_format,
                     encoding='utf-8')
     else:
-        serialized = g.serialize(format=output_format)
-        args.output.write(serialized)
+        serialize_to_stream(g, args.output, output_format)
+
 
+def main(arguments, preloaded_graphs=None):
+    """Do the thing.
 
-def main(arguments):
-    """Do the thing."""
+    preloaded_graphs optionally maps input file paths to already parsed Graphs,
+    which export and update use instead of parsing those files again.
+    """
     args = configure_arg_parser().parse_args(args=arguments)
 
     if 'debug' in args and args.debug:
@@ -299,27 +372,15 @@ def main(arguments):
 
     if args.command == 'graphic':
         generate_graphic(args.action, args.ontology, args.endpoint,
-                         limit=args.instance_limit, threshold=args.predicate_threshold,
-                         single_graph=args.single_ontology_graphs,
-                         wee=args.wee, outpath=args.output, version=args.version,
-                         no_image=args.no_image, title=args.title, hide=args.hide,
-                         label_language=args.label_language,
-                         concentrate_links=args.link_concentrator_threshold,
-                         include=args.include, exclude=args.exclude,
-                         include_pattern=args.include_pattern,
-                         exclude_pattern=args.exclude_pattern,
-                         show_shacl=args.show_shacl,
-                         cache=args.cache,
-                         save_cache=args.save_cache,
-                         show_bnode_subjects=args.show_bnode_subjects)
+                         **__graphic_options(args))
         return
 
     of = 'pretty-xml' if args.format == 'xml' else args.format
 
     if args.command == 'export':
-        export_ontology(args, of)
+        export_ontology(args, of, preloaded_graphs)
     else:
-        update_ontology(args, of)
+        update_ontology(args, of, preloaded_graphs)
 
 
 def run_tool():
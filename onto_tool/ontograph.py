@@ -12,23 +12,175 @@ import json
 import logging
 import os
 import re
+import subprocess
 import sys
-from collections import defaultdict
+import tempfile
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from math import log
 from string import Template
 from time import perf_counter
 from urllib.parse import urlparse, urlunparse
 
-import pydot
-from rdflib import BNode, Graph
+from rdflib import BNode, Graph, URIRef
 from rdflib.namespace import OWL, RDF
-from rdflib.util import guess_format
 
+from . import VERSION
 from .sparql_utils import create_endpoint, select_query
+from .utils import guess_rdf_format, parse_rdf_nt_cached
 
 # Ignore \l - uses them as a line separator
 # pylint: disable=W1401
 
+# Identifiers that can be written to DOT output without quoting
+_DOT_ID_RE = re.compile(r'^(?:[_a-zA-Z][a-zA-Z0-9_]*|-?(?:\.[0-9]+|[0-9]+(?:\.[0-9]*)?))$')
+_DOT_KEYWORDS = {'node', 'edge', 'graph', 'digraph', 'subgraph', 'strict'}
+
+# Entity types listed separately in each ontology's schema node
+_SCHEMA_ENTITY_TYPES = (OWL.Class, OWL.ObjectProperty, OWL.DatatypeProperty,
+                        OWL.AnnotationProperty)
+
+# Version suffix removed from local names by _strip_uri
+_VERSION_SUFFIX_RE = re.compile(r'(X.x.x|\d+.\d+.\d+)$')
+
+# Schema node data per (absolute path, mtime, size, show_bnode_subjects), so repeated
+# graphics in the same process (e.g. from a bundle) do not re-parse unchanged files.
+# Least recently used entries are evicted beyond _SCHEMA_INFO_CACHE_SIZE.
+_SCHEMA_INFO_CACHE = OrderedDict()
+_SCHEMA_INFO_CACHE_SIZE = 256
+
+# Schema files are only parsed in worker processes when there are at least this many
+# files and bytes to parse; below that, starting workers costs more than it saves
+_PARALLEL_MIN_FILES = 4
+_PARALLEL_MIN_BYTES = 1 << 20
+
+# Stamp of the .ontograf-cache.json layout and of the tool that extracted the entries;
+# a cache with a different stamp is ignored, so extraction changes take effect
+_SCHEMA_CACHE_FORMAT = f'1/{VERSION}'
+
+# Keys of the schema node data returned by _gather_schema_file_info
+_SCHEMA_INFO_FIELDS = frozenset((
+    'ontology', 'ontologyName', 'classesList', 'obj_propertiesList', 'data_propertiesList',
+    'annotation_propertiesList', 'gist_thingsList', 'imports'))
+
+# Stands in for the predicate IRI in the pre-rendered graph filter pattern
+_PREDICATE_PLACEHOLDER = 'PREDICATE_PLACEHOLDER'
+
+
+@lru_cache(maxsize=4096)
+def _local_name(iri):
+    """Reduce an IRI string to its local name without any trailing version, possibly empty."""
+    if iri.endswith(('/', '#')):
+        iri = iri[:-1]
+    separator = max(iri.rfind('/'), iri.rfind('#'))
+    if separator < 0:
+        return iri
+    stripped = iri[separator + 1:]
+    version = _VERSION_SUFFIX_RE.search(stripped)
+    return stripped[:version.start()] if version else stripped
+
+
+def _strip_uri(uri):
+    """Reduce an IRI to its local name, dropping any trailing version."""
+    stripped = _local_name(str(uri))
+    if not stripped:
+        logging.warning("Stripping %s went horribly wrong", uri)
+        return uri
+    return stripped
+
+
+def _cached_schema_info(key):
+    """Look up schema node data in the process cache, marking it recently used."""
+    info = _SCHEMA_INFO_CACHE.get(key)
+    if info is not None:
+        _SCHEMA_INFO_CACHE.move_to_end(key)
+    return info
+
+
+def _cache_schema_info(key, info):
+    """Add schema node data to the process cache, evicting the least recently used."""
+    _SCHEMA_INFO_CACHE[key] = info
+    _SCHEMA_INFO_CACHE.move_to_end(key)
+    while len(_SCHEMA_INFO_CACHE) > _SCHEMA_INFO_CACHE_SIZE:
+        _SCHEMA_INFO_CACHE.popitem(last=False)
+
+
+def _init_schema_worker(log_level):
+    """Configure logging in a schema parsing worker like in the parent process."""
+    logging.basicConfig(level=log_level)
+
+
+def _gather_schema_file_info(file_path, show_bnode_subjects=False, nt_cache_dir=None):
+    """Parse one ontology file and extract the entity lists for its schema node.
+
+    Module level so that it can be dispatched to worker processes.
+    """
+    filename = os.path.basename(file_path)
+    logging.debug('Parsing %s for documentation', filename)
+    graph = Graph()
+    if nt_cache_dir:
+        parse_rdf_nt_cached(graph, file_path, nt_cache_dir)
+    else:
+        graph.parse(file_path, format=guess_rdf_format(file_path))
+
+    # Single pass over rdf:type, bucketing subjects by the types of interest
+    ontologies = []
+    entities = {t: [] for t in _SCHEMA_ENTITY_TYPES}
+    typed_subjects = []
+    for s, _, entity_type in graph.triples((None, RDF.type, None)):
+        if entity_type == OWL.Ontology:
+            ontologies.append(s)
+        if isinstance(s, BNode) and not show_bnode_subjects:
+            if entity_type not in entities or entity_type == OWL.Class:
+                continue
+        bucket = entities.get(entity_type)
+        if bucket is not None:
+            bucket.append(_strip_uri(s))
+        else:
+            typed_subjects.append(s)
+
+    ontology = ontologies[0]
+    ontology_name = _strip_uri(ontology)
+    classes = entities[OWL.Class]
+    obj_props = entities[OWL.ObjectProperty]
+    data_props = entities[OWL.DatatypeProperty]
+    annotation_props = entities[OWL.AnnotationProperty]
+    all_seen = set(classes + obj_props + data_props + annotation_props)
+    gist_things = [
+        _strip_uri(s) for s in typed_subjects
+        if s != ontology and _strip_uri(s) not in all_seen]
+    imports = [_strip_uri(c)
+               for c in graph.objects(ontology, OWL.imports)]
+
+    # Names are de-duplicated (preserving order) before joining into label lines
+    return filename, {
+        "ontology": ontology,
+        "ontologyName": ontology_name,
+        "classesList": "\\l".join(dict.fromkeys(classes)),
+        "obj_propertiesList": "\\l".join(dict.fromkeys(obj_props)),
+        "data_propertiesList": "\\l".join(dict.fromkeys(data_props)),
+        "annotation_propertiesList": "\\l".join(dict.fromkeys(annotation_props)),
+        "gist_thingsList": "\\l".join(dict.fromkeys(gist_things)),
+        "imports": imports
+    }
+
+
+def _dot_quote(value):
+    """Quote a DOT identifier or attribute value unless it is a plain ID, number or HTML label."""
+    if not isinstance(value, str):
+        return str(value)
+    if value.startswith('<') and value.endswith('>'):
+        return value
+    if _DOT_ID_RE.match(value) and value.lower() not in _DOT_KEYWORDS:
+        return value
+    return '"' + value.replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def _dot_attributes(attributes):
+    """Format attributes as the body of a DOT attribute list."""
+    return ', '.join(f'{key}={_dot_quote(value)}' for key, value in attributes.items())
+
 
 class OntoGraf:
     """Generates schema or instance graphs."""
@@ -43,11 +195,12 @@ class OntoGraf:
 
         out_filename = self.__configure_data_source(
             repo, kwargs, title, version)
-        self.graf = None
+        self._dot_lines = []
         self.files = files
         self.repo = repo
         self.data = None
         self.no_image = kwargs.get('no_image', False)
+        self.write_output = kwargs.get('write_output', True)
         self.single_graph = kwargs.get('single_graph', False)
         self.concentrate_links = kwargs.get('concentrate_links')
 
@@ -59,6 +212,9 @@ class OntoGraf:
         else:
             self.outdot = self.outpath + ".dot"
             self.outpng = self.outpath + ".png"
+        self.schema_cache = kwargs.get('schema_cache', False)
+        self.schema_cache_path = os.path.join(os.path.dirname(self.outdot),
+                                              '.ontograf-cache.json')
 
         self.limit = kwargs.get('limit', 500000)
         self.threshold = kwargs.get('threshold', 10)
@@ -79,12 +235,16 @@ class OntoGraf:
         self.exclude = kwargs.get('exclude')
         self.include_pattern = kwargs.get('include_pattern')
         self.exclude_pattern = kwargs.get('exclude_pattern')
+        self.__graph_pattern_template = self.__build_graph_pattern_template()
 
         self.superclasses = defaultdict(set)
 
         self.show_shacl = kwargs.get('show_shacl')
         self.shapes = defaultdict(list)
         self.show_bnode_subjects = kwargs.get('show_bnode_subjects')
+        # N-Triples copies of the inputs are kept next to the output, away from the inputs
+        self.nt_cache_dir = os.path.join(os.path.dirname(self.outdot), '.ontograf-nt-cache') \
+            if kwargs.get('nt_cache', False) else None
 
     def __configure_data_source(self, repo, kwargs, title, version):
         """Determine graph title and output location from data source."""
@@ -136,7 +296,10 @@ class OntoGraf:
             for file_path in self.files:
                 filename = os.path.basename(file_path)
                 logging.debug('Parsing %s for documentation', filename)
-                self.data.parse(file_path, format=guess_format(file_path))
+                if self.nt_cache_dir:
+                    parse_rdf_nt_cached(self.data, file_path, self.nt_cache_dir)
+                else:
+                    self.data.parse(file_path, format=guess_rdf_format(file_path))
 
         results = self.data.query(query)
         for result in results:
@@ -152,54 +315,95 @@ class OntoGraf:
             return data
         return list(self.__local_select_query(query))
 
-    @staticmethod
-    def __strip_uri(uri):
-        stripped = re.sub(r'^.*[/#](.*?)(X.x.x|\d+.\d+.\d+)?$', '\\1',
-                          re.sub(r'[#/]$', '', str(uri)))
-        if not stripped:
-            logging.warning("Stripping %s went horribly wrong", uri)
-            return uri
-        return stripped
+    __strip_uri = staticmethod(_strip_uri)
 
     def gather_schema_info_from_files(self):
         """Load schema data from local ontology."""
+        keys = {file_path: self.__schema_info_key(file_path) for file_path in self.files}
+        saved = self.__load_schema_cache() if self.schema_cache else {}
+        infos = {}
+        for key in keys.values():
+            info = _cached_schema_info(key)
+            if info is None:
+                info = saved.get(key)
+            if info is not None:
+                infos[key] = info
+        to_parse = [file_path for file_path in self.files if keys[file_path] not in infos]
+        gather = partial(_gather_schema_file_info,
+                         show_bnode_subjects=self.show_bnode_subjects,
+                         nt_cache_dir=self.nt_cache_dir)
+        if len(to_parse) < _PARALLEL_MIN_FILES or \
+                sum(os.path.getsize(f) for f in to_parse) < _PARALLEL_MIN_BYTES:
+            results = list(map(gather, to_parse))
+        else:
+            # Files are independent and parsing is CPU bound, spread them over processes.
+            # Small chunks keep every worker busy when there are only a few files per core.
+            workers = min(os.cpu_count() or 1, len(to_parse))
+            log_level = logging.getLogger().getEffectiveLevel()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_schema_worker,
+                                     initargs=(log_level,)) as executor:
+                results = list(executor.map(
+                    gather, to_parse, chunksize=max(1, len(to_parse) // (4 * workers))))
+        for file_path, result in zip(to_parse, results):
+            infos[keys[file_path]] = result
+        for key, info in infos.items():
+            _cache_schema_info(key, info)
+        if self.schema_cache and self.write_output \
+                and any(key not in saved for key in keys.values()):
+            self.__save_schema_cache(saved, infos)
+
         self.node_data = {}
         for file_path in self.files:
-            filename = os.path.basename(file_path)
-            logging.debug('Parsing %s for documentation', filename)
-            graph = Graph()
-            graph.parse(file_path, format=guess_format(file_path))
-
-            ontology = next(graph.subjects(RDF.type, OWL.Ontology))
-            ontology_name = self.__strip_uri(ontology)
-            classes = [self.__strip_uri(c) for c in graph.subjects(RDF.type, OWL.Class)
-                       if not isinstance(c, BNode) or self.show_bnode_subjects]
-            obj_props = [self.__strip_uri(c)
-                         for c in graph.subjects(RDF.type, OWL.ObjectProperty)]
-            data_props = [self.__strip_uri(c)
-                          for c in graph.subjects(RDF.type, OWL.DatatypeProperty)]
-            annotation_props = [self.__strip_uri(c)
-                                for c in graph.subjects(RDF.type, OWL.AnnotationProperty)]
-            all_seen = set(classes + obj_props + data_props + annotation_props)
-            gist_things = [
-                self.__strip_uri(s) for (s, o) in graph.subject_objects(RDF.type)
-                if (not isinstance(s, BNode) or self.show_bnode_subjects) and
-                not s == ontology and not self.__strip_uri(s) in all_seen]
-            imports = [self.__strip_uri(c)
-                       for c in graph.objects(ontology, OWL.imports)]
-
-            self.node_data[filename] = {
-                "ontology": ontology,
-                "ontologyName": ontology_name,
-                "classesList": "\\l".join(classes),
-                "obj_propertiesList": "\\l".join(obj_props),
-                "data_propertiesList": "\\l".join(data_props),
-                "annotation_propertiesList": "\\l".join(annotation_props),
-                "gist_thingsList": "\\l".join(gist_things),
-                "imports": imports
-            }
+            filename, file_data = infos[keys[file_path]]
+            self.node_data[filename] = dict(file_data)
         return self.node_data
 
+    def __schema_info_key(self, file_path):
+        """Identify a file's schema info by path, modification time, size and bnode setting."""
+        stat = os.stat(file_path)
+        return (f'{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}'
+                f'|{bool(self.show_bnode_subjects)}')
+
+    def __load_schema_cache(self):
+        """Read schema info saved by previous runs.
+
+        A missing or unreadable cache, or one written by a different version,
+        is ignored, as are malformed entries.
+        """
+        try:
+            with open(self.schema_cache_path, encoding='utf-8') as cache_file:
+                saved = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(saved, dict) or saved.get('format') != _SCHEMA_CACHE_FORMAT \
+                or not isinstance(saved.get('entries'), dict):
+            logging.debug('Ignoring schema cache %s from another version', self.schema_cache_path)
+            return {}
+        entries = {}
+        for key, entry in saved['entries'].items():
+            try:
+                filename, file_data = entry
+                if not isinstance(filename, str) or set(file_data) != _SCHEMA_INFO_FIELDS:
+                    continue
+                entries[key] = (filename, dict(file_data, ontology=URIRef(file_data['ontology'])))
+            except (TypeError, ValueError):
+                continue
+        logging.debug('Loaded schema cache %s', self.schema_cache_path)
+        return entries
+
+    def __save_schema_cache(self, saved, infos):
+        """Write the schema cache, replacing stale entries for the files just processed."""
+        current_paths = {key.rsplit('|', 3)[0] for key in infos}
+        entries = {key: value for key, value in saved.items()
+                   if key.rsplit('|', 3)[0] not in current_paths}
+        entries.update(infos)
+        cache_dir = os.path.dirname(self.schema_cache_path) or '.'
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_dir,
+                                         suffix='.tmp', delete=False) as cache_file:
+            json.dump({'format': _SCHEMA_CACHE_FORMAT, 'entries': entries}, cache_file)
+        os.replace(cache_file.name, self.schema_cache_path)
+        logging.debug('Saved schema cache %s', self.schema_cache_path)
+
     def gather_schema_info_from_repo(self):
         """Load schema data from SPARQL endpoint."""
         onto_data = defaultdict(lambda: defaultdict(list))
@@ -281,26 +485,24 @@ class OntoGraf:
                     ]
 
     def create_schema_graf(self):
-        """Create schema graph from local or remote data."""
+        """Create schema graph from local or remote data, returning the DOT text."""
         data_dict = self.node_data
         wee = self.wee
         # When 'wee' is not specified at all, it will be None
         # When 'wee' is for all ontologies, it will be an empty list
         # Otherwise, it will contain a list of ontology URI patterns
         if wee is not None and not wee:
-            self.graf = pydot.Dot(graph_type='digraph',
-                                  label=self.title,
-                                  labelloc='t',
-                                  rankdir="TB")
+            graph_attributes = {'label': self.title,
+                                'labelloc': 't',
+                                'rankdir': "TB"}
         else:
-            self.graf = pydot.Dot(graph_type='digraph',
-                                  label=self.title,
-                                  labelloc='t',
-                                  rankdir="LR",
-                                  ranksep="0.5",
-                                  nodesep="1.25")
-
-        self.graf.set_node_defaults(**{
+            graph_attributes = {'label': self.title,
+                                'labelloc': 't',
+                                'rankdir': "LR",
+                                'ranksep': "0.5",
+                                'nodesep': "1.25"}
+
+        self.__start_dot(graph_attributes, {
             'color': 'lightgray',
             'style': 'unfilled',
             'shape': 'record',
@@ -318,30 +520,67 @@ class OntoGraf:
                     not wee or any(re.search(pat, ontology) for pat in wee)
                 )
                 if render_compact:
-                    node = pydot.Node(ontology_name)
+                    self.__add_dot_node(ontology_name)
                 else:
-                    ontology_info = "{{{}\\l\\l{}|{}|{}|{}|{}|{}}}".format(
-                        file,
-                        ontology_name,
-                        file_data["classesList"],
-                        file_data["obj_propertiesList"],
-                        file_data["data_propertiesList"],
-                        file_data["annotation_propertiesList"],
-                        file_data["gist_thingsList"])
-                    node = pydot.Node(ontology_name,
-                                      label=ontology_info)
-
-                self.graf.add_node(node)
+                    ontology_info = (
+                        f'{{{file}\\l\\l{ontology_name}'
+                        f'|{file_data["classesList"]}'
+                        f'|{file_data["obj_propertiesList"]}'
+                        f'|{file_data["data_propertiesList"]}'
+                        f'|{file_data["annotation_propertiesList"]}'
+                        f'|{file_data["gist_thingsList"]}}}')
+                    self.__add_dot_node(ontology_name, label=ontology_info)
 
                 for imported in file_data["imports"]:
-                    edge = pydot.Edge(ontology_name, imported,
-                                      color=self.arrow_color,
-                                      arrowhead=self.arrowhead)
-                    self.graf.add_edge(edge)
-        self.graf.write(self.outdot)
-        if not self.no_image:
-            self.graf.write(self.outpng, format='png')
-        logging.debug("Plots saved")
+                    self.__add_dot_edge(ontology_name, imported,
+                                        color=self.arrow_color,
+                                        arrowhead=self.arrowhead)
+        return self.__write_dot()
+
+    def __start_dot(self, graph_attributes, node_defaults):
+        """Begin a new DOT digraph with the given graph attributes and node defaults."""
+        self._dot_lines = ['digraph G {\n']
+        self._dot_lines.extend(f'{key}={_dot_quote(value)};\n'
+                               for key, value in graph_attributes.items())
+        self._dot_lines.append(f'node [{_dot_attributes(node_defaults)}];\n')
+
+    def __add_dot_node(self, name, **attributes):
+        if attributes:
+            self._dot_lines.append(f'{_dot_quote(name)} [{_dot_attributes(attributes)}];\n')
+        else:
+            self._dot_lines.append(f'{_dot_quote(name)};\n')
+
+    def __add_dot_edge(self, source, target, **attributes):
+        self._dot_lines.append(
+            f'{_dot_quote(source)} -> {_dot_quote(target)} [{_dot_attributes(attributes)}];\n')
+
+    def __write_dot(self):
+        """Close the digraph and return its text.
+
+        Unless output is disabled, the .dot file is saved and the .png rendered.
+        """
+        self._dot_lines.append('}\n')
+        dot_text = ''.join(self._dot_lines)
+        if self.write_output:
+            with open(self.outdot, 'w', encoding='utf-8') as dot_file:
+                dot_file.write(dot_text)
+            if not self.no_image:
+                self.__render_png(dot_text)
+            logging.debug("Plots saved")
+        return dot_text
+
+    def __render_png(self, dot_text):
+        """Lay out and render the graph in-process if pygraphviz is installed, else via dot."""
+        try:
+            # Optional dependency, only needed for in-process rendering
+            # pylint: disable=C0415
+            import pygraphviz
+        except ImportError:
+            subprocess.run(['dot', '-Tpng', '-o', self.outpng],
+                           input=dot_text.encode('utf-8'), check=True)
+            return
+        graph = pygraphviz.AGraph(string=dot_text)
+        graph.draw(self.outpng, format='png', prog='dot')
 
     class ProgressBar():
         """Renders a progress bar in a terminal.
@@ -774,6 +1013,7 @@ class OntoGraf:
     MAX_LINE_WIDTH = 5
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def __line_width(num_used, graph_max):
         """Scale line width relative to the most commonly occurring edge for the graph"""
         if graph_max == 1:
@@ -793,6 +1033,7 @@ class OntoGraf:
     MIN_FONT_SIZE = 14
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def __font_size(num_instances, graph_max):
         """Scale line width relative to the most commonly occurring edge for the graph"""
         if num_instances == 0 or graph_max == 1:
@@ -807,14 +1048,14 @@ class OntoGraf:
             return OntoGraf.MIN_FONT_SIZE
 
     def create_instance_graf(self, data_dict=None):
-        """Create graph from gathered instance data."""
-        self.graf = pydot.Dot(graph_type='digraph',
-                              label=self.title,
-                              labelloc='t',
-                              rankdir="LR",
-                              ranksep="0.5")
-
-        self.graf.set_node_defaults(**{
+        """Create graph from gathered instance data, returning the DOT text.
+
+        Returns None if no instance data was found.
+        """
+        self.__start_dot({'label': self.title,
+                          'labelloc': 't',
+                          'rankdir': "LR",
+                          'ranksep': "0.5"}, {
             'color': 'lightgray',
             'style': 'unfilled',
             'shape': 'rect',
@@ -841,10 +1082,7 @@ class OntoGraf:
         max_instance = max(self.class_counts.values())
 
         for class_, class_data in data_dict.items():
-            node = self.__create_instance_graph_node(
-                max_instance, class_, class_data)
-
-            self.graf.add_node(node)
+            self.__add_instance_graph_node(max_instance, class_, class_data)
 
             by_predicate, compacted_links = self.__determine_compacted_links(
                 class_, class_data)
@@ -853,29 +1091,24 @@ class OntoGraf:
                 predicate, predicate_str, target = link
                 if predicate in compacted_links and target != class_:
                     continue
-                edge = pydot.Edge(class_, target,
-                                  label=predicate_str,
-                                  penwidth=self.__line_width(num, max_common),
-                                  color=self.shacl_color if predicate in self.shapes[
-                                      class_] else self.arrow_color,
-                                  arrowhead=self.arrowhead)
-                self.graf.add_edge(edge)
+                self.__add_dot_edge(class_, target,
+                                    label=predicate_str,
+                                    penwidth=self.__line_width(num, max_common),
+                                    color=self.shacl_color if predicate in self.shapes[
+                                        class_] else self.arrow_color,
+                                    arrowhead=self.arrowhead)
 
             for predicate in compacted_links:
                 self.add_compacted_edges(
                     max_common, class_, predicate, class_data, by_predicate[predicate])
 
             for super_class in class_data['supers']:
-                edge = pydot.Edge(class_, super_class,
-                                  penwidth=1,
-                                  color=self.super_color,
-                                  arrowhead='normal')
-                self.graf.add_edge(edge)
+                self.__add_dot_edge(class_, super_class,
+                                    penwidth=1,
+                                    color=self.super_color,
+                                    arrowhead='normal')
 
-        self.graf.write(self.outdot, encoding="utf-8")
-        if not self.no_image:
-            self.graf.write(self.outpng, format='png')
-        logging.debug("Plots saved")
+        return self.__write_dot()
 
     def add_compacted_edges(self, max_common: int, source_class: str, predicate: str,
                             class_data: dict, links: dict):
@@ -887,53 +1120,53 @@ class OntoGraf:
         This makes the diagram less crowded and clearer.
         """
         shared_node_id = source_class + '_' + predicate
-        shared_node = pydot.Node(
-            name='"' + shared_node_id + '"', shape='point', color="black")
-        self.graf.add_node(shared_node)
+        self.__add_dot_node(shared_node_id, shape='point', color="black")
         total_count = sum(class_data['links'][link] for link in links)
         edge_color = self.shacl_color if predicate in self.shapes[
             source_class] else self.arrow_color
         predicate_label = next(link for link in links)[1]
-        self.graf.add_edge(
-            pydot.Edge(source_class, shared_node_id,
-                       label=predicate_label,
-                       penwidth=self.__line_width(total_count, max_common), color=edge_color))
+        self.__add_dot_edge(source_class, shared_node_id,
+                            label=predicate_label,
+                            penwidth=self.__line_width(total_count, max_common), color=edge_color)
         for link in links:
             _, _, target = link
-            edge = pydot.Edge(shared_node_id, target,
-                              penwidth=self.__line_width(
-                                  class_data['links'][link], max_common),
-                              color=edge_color,
-                              arrowhead=self.arrowhead)
-            self.graf.add_edge(edge)
+            self.__add_dot_edge(shared_node_id, target,
+                                penwidth=self.__line_width(
+                                    class_data['links'][link], max_common),
+                                color=edge_color,
+                                arrowhead=self.arrowhead)
 
     def __determine_compacted_links(self, class_, class_data):
-        by_predicate = defaultdict(set)
-        if self.concentrate_links != 0:
-            for link in class_data['links']:
-                predicate, _, target = link
-                # Don't concentrate self-links
-                if class_ != target:
-                    by_predicate[predicate].add(link)
+        if not self.concentrate_links:
+            return {}, set()
+
+        # Links are already unique keys of class_data['links'], no need to dedup
+        by_predicate = defaultdict(list)
+        for link in class_data['links']:
+            predicate, _, target = link
+            # Don't concentrate self-links
+            if class_ != target:
+                by_predicate[predicate].append(link)
 
         compacted_links = set(predicate for predicate, links in by_predicate.items()
                               if len(links) >= self.concentrate_links)
 
         return by_predicate, compacted_links
 
-    def __create_instance_graph_node(self, max_instance, class_, class_data):
+    def __add_instance_graph_node(self, max_instance, class_, class_data):
         # Using .format is more readable here
         # pylint: disable=C0209
 
-        node_font_size = self.__font_size(
-            self.class_counts[class_], max_instance)
-        node_line_width = self.__line_width(
-            self.class_counts[class_], max_instance)
+        class_count = self.class_counts[class_]
+        has_shape = class_ in self.shapes
+        shape_predicates = self.shapes.get(class_, ())
+        node_font_size = self.__font_size(class_count, max_instance)
+        node_line_width = self.__line_width(class_count, max_instance)
         class_label = class_data['label'] if class_data['label'] else self.__strip_uri(class_)
 
         if class_data['data']:
             formatted_label = '<font point-size="{fontsize}" color="{label_fg}">{class_label}</font>'.format(
-                label_fg="white" if class_ in self.shapes else "black",
+                label_fg="white" if has_shape else "black",
                 fontsize=node_font_size,
                 class_label=class_label
             )
@@ -945,28 +1178,26 @@ class OntoGraf:
                     <td align="center">{attribute_text}</td>
                     </tr>
                 </table>>""".format(
-                    label_bg="darkgreen" if class_ in self.shapes else "white",
+                    label_bg="darkgreen" if has_shape else "white",
                     formatted_label=formatted_label,
                     line_width=node_line_width,
                     attribute_text="<br/>".join(
                         '<font point-size="{fontsize}" color="{color}">{prop}: {dt}</font>'.format(
-                            color="darkgreen" if predicate in self.shapes[class_] else "black",
+                            color="darkgreen" if predicate in shape_predicates else "black",
                             fontsize=round(node_font_size * 2 / 3),
                             prop=prop, dt=dt) for predicate, prop, dt in class_data['data'].keys()))
-            node = pydot.Node(name='"' + class_ + '"',
-                              margin="0",
-                              label=class_info)
+            self.__add_dot_node(class_,
+                                margin="0",
+                                label=class_info)
         else:
-            node = pydot.Node(name='"' + class_ + '"',
-                              label=class_label,
-                              style='filled',
-                              fontsize=node_font_size,
-                              penwidth=node_line_width,
-                              color="black",
-                              fillcolor="darkgreen" if class_ in self.shapes else "white",
-                              fontcolor="white" if class_ in self.shapes else "black")
-
-        return node
+            self.__add_dot_node(class_,
+                                label=class_label,
+                                style='filled',
+                                fontsize=node_font_size,
+                                penwidth=node_line_width,
+                                color="black",
+                                fillcolor="darkgreen" if has_shape else "white",
+                                fontcolor="white" if has_shape else "black")
 
     def __ontology_matches_filter(self, ontology):
         if self.include:
@@ -980,6 +1211,11 @@ class OntoGraf:
         return True
 
     def __filtered_graph_pattern(self, predicate):
+        return self.__graph_pattern_template.replace(_PREDICATE_PLACEHOLDER, predicate)
+
+    def __build_graph_pattern_template(self):
+        """Render the graph filter pattern once, with a placeholder for the predicate."""
+        predicate = _PREDICATE_PLACEHOLDER
         if not self.repo:
             # Local files always go in the default graph
             return f'?s <{predicate}> ?o .'
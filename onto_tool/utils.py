@@ -1,20 +1,51 @@
 """Utility methods shared by multiple subcommands"""
+import codecs
+import hashlib
 import logging
 import re
+import shutil
+import tempfile
+from functools import lru_cache
 from glob import glob
-from os.path import isdir, isfile, join
+from os import makedirs
+from os.path import abspath, basename, getmtime, isdir, isfile, join, realpath, splitext
 import sys
 
-from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
-from rdflib.namespace import OWL, RDF, RDFS, SKOS, XSD
+from rdflib import BNode, ConjunctiveGraph, Graph, Literal, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+from rdflib.plugin import PluginException
 from rdflib.plugins.parsers.notation3 import BadSyntax
 from rdflib.util import guess_format
 
+# Trailing numeric or X.x.x version of an IRI
+_VERSION_TAIL_RE = re.compile(r'(?:\d+|[Xx])\.(?:\d+|[Xx])\.(?:\d+|[Xx])$')
+
+# Entity types annotated by add_defined_by in 'strict' mode
+_DEFINED_BY_STRICT_TYPES = (OWL.Class, OWL.ObjectProperty, OWL.DatatypeProperty,
+                            OWL.AnnotationProperty, OWL.Thing)
+
+
+@lru_cache(maxsize=None)
+def _format_for_extension(ext):
+    return guess_format('x' + ext)
+
+
+def guess_rdf_format(onto_file):
+    """Guess the RDF serialization of a file from its extension, caching per extension."""
+    return _format_for_extension(splitext(onto_file)[1])
+
+
+@lru_cache(maxsize=4096)
+def _strip_version(iri):
+    """Return iri without its trailing version, or None if it is unversioned."""
+    match = _VERSION_TAIL_RE.search(iri)
+    return iri[:match.start()] if match else None
+
 
 def parse_rdf(g: Graph, onto_file: str, rdf_format: str = None):
     """Import local RDF content into the graph, report parse error."""
     try:
-        g.parse(onto_file, format=rdf_format if rdf_format is not None else guess_format(
+        g.parse(onto_file, format=rdf_format if rdf_format is not None else guess_rdf_format(
             onto_file))
     except BadSyntax as se:
         # noinspection PyProtectedMember
@@ -28,18 +59,108 @@ def parse_rdf(g: Graph, onto_file: str, rdf_format: str = None):
         sys.exit(1)
 
 
+def nt_cache_path(onto_file: str, cache_dir: str):
+    """Path of the N-Triples copy of onto_file in cache_dir.
+
+    The name includes a digest of the absolute source path, so files with the
+    same name in different directories do not share a copy.
+    """
+    digest = hashlib.blake2b(abspath(onto_file).encode('utf-8'), digest_size=8).hexdigest()
+    return join(cache_dir, f'{basename(onto_file)}.{digest}.nt')
+
+
+def parse_rdf_nt_cached(g: Graph, onto_file: str, cache_dir: str):
+    """Import local RDF content via an N-Triples copy kept in cache_dir.
+
+    The copy is parsed instead of the original when it is at least as recent,
+    otherwise it is (re)created after parsing. If the copy cannot be written,
+    a warning is logged and the parsed content is still used.
+    """
+    rdf_format = guess_rdf_format(onto_file)
+    if rdf_format == 'nt':
+        parse_rdf(g, onto_file, rdf_format)
+        return
+    nt_file = nt_cache_path(onto_file, cache_dir)
+    if isfile(nt_file) and getmtime(nt_file) >= getmtime(onto_file):
+        logging.debug('Using N-Triples cache %s', nt_file)
+        parse_rdf(g, nt_file, 'nt')
+        return
+    parsed = Graph()
+    parse_rdf(parsed, onto_file, rdf_format)
+    try:
+        makedirs(cache_dir, exist_ok=True)
+        parsed.serialize(destination=nt_file, format='nt', encoding='utf-8')
+        logging.debug('Saved N-Triples cache %s', nt_file)
+    except OSError as e:
+        logging.warning('Unable to save N-Triples cache %s: %s', nt_file, e)
+    g += parsed
+
+
+def _copy_graph(source):
+    g = Graph()
+    for prefix, namespace in source.namespaces():
+        g.bind(prefix, namespace)
+    g += source
+    return g
+
+
+def load_rdf_graph(onto_file, rdf_format=None, preloaded=None):
+    """Parse a local RDF file into a new Graph.
+
+    If preloaded maps the path to an already parsed Graph, a copy of that
+    graph is returned instead of parsing the file again.
+    """
+    if preloaded and onto_file in preloaded:
+        return _copy_graph(preloaded[onto_file])
+    g = Graph()
+    parse_rdf(g, onto_file, rdf_format)
+    return g
+
+
+def _distinct_files(files):
+    """Drop repeated references to the same file, keeping the first."""
+    seen = {}
+    distinct = []
+    for onto_file in files:
+        real_path = realpath(onto_file)
+        if real_path in seen:
+            logging.debug('Skipping %s, same file as %s', onto_file, seen[real_path])
+            continue
+        seen[real_path] = onto_file
+        distinct.append(onto_file)
+    return distinct
+
+
+def serialize_to_stream(g, output, rdf_format):
+    """Serialize the graph to a writable text stream.
+
+    If the stream is UTF-8 and exposes its binary buffer (files, stdout), rdflib
+    writes encoded output straight into it instead of building the whole
+    serialization as a string. Other encodings go through the text stream, so
+    characters it cannot encode raise an error instead of being replaced.
+    """
+    buffer = getattr(output, 'buffer', None)
+    encoding = getattr(output, 'encoding', None)
+    if buffer is None or encoding is None or codecs.lookup(encoding).name != 'utf-8':
+        output.write(g.serialize(format=rdf_format))
+        return
+    output.flush()
+    g.serialize(destination=buffer, format=rdf_format, encoding='utf-8')
+    buffer.flush()
+
+
 def find_single_ontology(g, onto_file):
     """Verify that file has a single ontology defined and return the IRI."""
-    ontologies = list(g.subjects(RDF.type, OWL.Ontology))
-    if len(ontologies) == 0:
+    ontologies = g.subjects(RDF.type, OWL.Ontology)
+    ontology = next(ontologies, None)
+    if ontology is None:
         logging.warning('No ontology definition found in %s', onto_file)
         return None
-    if len(ontologies) > 1:
+    if next(ontologies, None) is not None:
         logging.error('Multiple ontologies defined in %s, skipping',
                       onto_file)
         return None
 
-    ontology = ontologies[0]
     logging.debug('%s found in %s', ontology, onto_file)
     return ontology
 
@@ -51,49 +172,45 @@ def add_defined_by(g, ontology_iri, mode='strict', replace=False, versioned=Fals
         if version_iri is not None:
             ontology_iri = version_iri
     if mode == 'strict':
-        selector = """
-          FILTER(?dtype IN (
-            owl:Class, owl:ObjectProperty, owl:DatatypeProperty,
-            owl:AnnotationProperty, owl:Thing
-          ))
-        """
+        candidates = g.triples_choices((None, RDF.type, list(_DEFINED_BY_STRICT_TYPES)))
     else:
-        selector = "FILTER(?dtype != owl:Ontology)"
-
-    query = """
-        SELECT distinct ?defined ?label ?defBy WHERE {
-          ?defined a ?dtype .
-          %s
-          FILTER(!ISBLANK(?defined))
-          FILTER EXISTS {
-            ?defined ?anotherProp ?value .
-            FILTER (?anotherProp != rdf:type)
-          }
-          OPTIONAL { ?defined rdfs:isDefinedBy ?defBy }
-        }
-        """ % selector
-
-    definitions = g.query(
-        query,
-        initNs={'owl': OWL, 'rdfs': RDFS, 'skos': SKOS})
-    for d in definitions:
-        if d.defBy:
-            if d.defBy == ontology_iri:
+        candidates = (t for t in g.triples((None, RDF.type, None)) if t[2] != OWL.Ontology)
+
+    definitions = []
+    seen = set()
+    for defined, _, _ in candidates:
+        if isinstance(defined, BNode) or defined in seen:
+            continue
+        seen.add(defined)
+        if not any(p != RDF.type for p in g.predicates(defined)):
+            continue
+        definitions.append((defined, list(g.objects(defined, RDFS.isDefinedBy))))
+
+    to_add = set()
+    to_remove = []
+    for defined, def_by_values in definitions:
+        if not def_by_values:
+            logging.debug('Added definedBy to %s', defined)
+            to_add.add(defined)
+            continue
+        for def_by in def_by_values:
+            if def_by == ontology_iri:
                 logging.debug('%s already defined by %s',
-                              d.defined, ontology_iri)
+                              defined, ontology_iri)
+            elif replace:
+                logging.debug(
+                    'Replaced definedBy for %s to %s',
+                    defined, ontology_iri)
+                to_remove.append((defined, RDFS.isDefinedBy, def_by))
+                if ontology_iri not in def_by_values:
+                    to_add.add(defined)
             else:
-                if replace:
-                    logging.debug(
-                        'Replaced definedBy for %s to %s',
-                        d.defined, ontology_iri)
-                    g.remove((d.defined, RDFS.isDefinedBy, d.defBy))
-                    g.add((d.defined, RDFS.isDefinedBy, ontology_iri))
-                else:
-                    logging.warning('%s defined by %s instead of %s',
-                                    d.defined, d.defBy, ontology_iri)
-        else:
-            logging.debug('Added definedBy to %s', d.defined)
-            g.add((d.defined, RDFS.isDefinedBy, ontology_iri))
+                logging.warning('%s defined by %s instead of %s',
+                                defined, def_by, ontology_iri)
+
+    for triple in to_remove:
+        g.remove(triple)
+    g.addN((defined, RDFS.isDefinedBy, ontology_iri, g) for defined in to_add)
 
 
 def expand_file_ref(path):
@@ -115,23 +232,21 @@ def strip_versions(g, ontology=None):
     ontologies = [ontology] if ontology else list(
         g.subjects(RDF.type, OWL.Ontology))
     for o in ontologies:
-        current_deps = g.objects(o, OWL.imports)
-        pattern = re.compile(
-            '^(.*?)((\\d+|[Xx])\\.(\\d+|[Xx])\\.(\\d+|[Xx]))?$')
+        # Materialized, since the graph is modified inside the loop
+        current_deps = list(g.objects(o, OWL.imports))
         for d in current_deps:
-            match = pattern.match(str(d))
-            if match.group(2):
+            base = _strip_version(str(d))
+            if base is not None:
                 logging.debug('Removing version for %s', d)
                 g.remove((o, OWL.imports, d))
-                g.add((o, OWL.imports, URIRef(match.group(1))))
+                g.add((o, OWL.imports, URIRef(base)))
 
 
 def version_sensitive_match(reference, ontologies, versions):
     """Check if reference is in ontologies, ignoring version."""
-    match = re.match(r'^(.*?)((\d+|[Xx])\.(\d+|[Xx])\.(\d+|[Xx]))?$',
-                     str(reference))
-    ref_without_version = match.group(1)
-    return URIRef(ref_without_version) in ontologies or reference in versions
+    iri = str(reference)
+    base = _strip_version(iri)
+    return URIRef(iri if base is None else base) in ontologies or reference in versions
 
 
 def clean_merge_artifacts(g, iri, version):
@@ -143,8 +258,7 @@ def clean_merge_artifacts(g, iri, version):
         if not version_sensitive_match(i, ontologies, versions))
     for o in ontologies:
         logging.debug('Removing existing ontology %s', o)
-        for t in list(g.triples((o, None, None))):
-            g.remove(t)
+        g.remove((o, None, None))
     logging.info('Creating new ontology %s:%s', iri, version)
     g.add((iri, RDF.type, OWL.Ontology))
     g.add((iri, OWL.versionIRI, URIRef(str(iri) + version)))
@@ -156,12 +270,81 @@ def clean_merge_artifacts(g, iri, version):
         g.add((iri, OWL.imports, i))
 
 
+def build_export_graph(g, paths, context=None,
+                       remove_dependency_versions=False,
+                       merge=None,
+                       defined_by=None,
+                       retain_defined_by=False,
+                       versioned_defined_by=False,
+                       preloaded=None):
+    """
+    Combine one or more files into a graph, applying the export options.
+
+    Parameters
+    ----------
+    g: Graph
+        Graph to populate, a ConjunctiveGraph if context is specified.
+
+    The remaining parameters are as for perform_export.
+
+    Returns
+    -------
+    Graph
+        g, or None if defined_by was requested and the combined graph
+        does not declare a single ontology.
+
+    """
+    parse_graph = g.get_context(context) if context else g
+    # Files are parsed in command line order, so the first prefix binding wins
+    for onto_file in _distinct_files(
+            [file for ref in paths for file in expand_file_ref(ref)]):
+        if preloaded and onto_file in preloaded:
+            file_graph = preloaded[onto_file]
+            parse_graph += file_graph
+            # Keep the prefixes declared in the input files for serialization
+            for prefix, namespace in file_graph.namespaces():
+                parse_graph.bind(prefix, namespace, override=False)
+        else:
+            parse_rdf(parse_graph, onto_file, guess_rdf_format(onto_file))
+
+    # Remove dep versions
+    if remove_dependency_versions:
+        strip_versions(parse_graph)
+
+    if merge:
+        clean_merge_artifacts(parse_graph, URIRef(merge[0]), merge[1])
+
+    # Add rdfs:isDefinedBy
+    if defined_by:
+        ontology_iri = find_single_ontology(parse_graph, 'merged graph')
+        if ontology_iri is None:
+            return None
+        add_defined_by(parse_graph, ontology_iri,
+                       mode=defined_by,
+                       replace=not retain_defined_by,
+                       versioned=versioned_defined_by)
+    return g
+
+
+def _open_store_graph(graph_class, store, store_dir):
+    """Open a graph in the named rdflib store plugin, report an unusable store."""
+    try:
+        g = graph_class(store=store)
+    except (PluginException, ImportError) as e:
+        logging.error("Cannot use store %s: %s", store, e)
+        sys.exit(1)
+    g.open(store_dir, create=True)
+    return g
+
+
 def perform_export(output, output_format, paths, context=None,
                    remove_dependency_versions=False,
                    merge=None,
                    defined_by=None,
                    retain_defined_by=False,
-                   versioned_defined_by=False):
+                   versioned_defined_by=False,
+                   store=None,
+                   preloaded=None):
     """
     Export one or more files as a single output.
 
@@ -196,6 +379,15 @@ def perform_export(output, output_format, paths, context=None,
         The default (False) functionality is to use the ontology IRI for
         rdfs:isDefinedBy annotations.
         If True and a versionIRI is present, use that instead.
+    store : string, optional
+        Name of an rdflib store plugin (e.g. BerkeleyDB, or Oxigraph from
+        oxrdflib) used to hold the combined graph in a temporary directory
+        instead of memory. Input files are parsed straight into the store;
+        preloaded graphs are already in memory and are copied into it.
+        The directory is removed after serialization.
+    preloaded : dict, optional
+        Maps file paths to already parsed Graphs, which are used instead of
+        parsing those files again.
 
     Returns
     -------
@@ -203,32 +395,22 @@ def perform_export(output, output_format, paths, context=None,
 
     """
     if context:
-        g = ConjunctiveGraph()
-        parse_graph = g.get_context(context)
         output_format = 'nquads'
-    else:
-        g = Graph()
-        parse_graph = g
-
-    for onto_file in [file for ref in paths for file in expand_file_ref(ref)]:
-        parse_rdf(parse_graph, onto_file)
-
-    # Remove dep versions
-    if remove_dependency_versions:
-        strip_versions(parse_graph)
-
-    if merge:
-        clean_merge_artifacts(parse_graph, URIRef(merge[0]), merge[1])
-
-    # Add rdfs:isDefinedBy
-    if defined_by:
-        ontology_iri = find_single_ontology(parse_graph, 'merged graph')
-        if ontology_iri is None:
-            return
-        add_defined_by(parse_graph, ontology_iri,
-                       mode=defined_by,
-                       replace=not retain_defined_by,
-                       versioned=versioned_defined_by)
-
-    serialized = g.serialize(format=output_format)
-    output.write(serialized)
+    graph_class = ConjunctiveGraph if context else Graph
+    store_dir = None
+    g = None
+    try:
+        if store:
+            store_dir = tempfile.mkdtemp(prefix='onto_tool_')
+            g = _open_store_graph(graph_class, store, store_dir)
+        else:
+            g = graph_class()
+        if build_export_graph(g, paths, context, remove_dependency_versions, merge,
+                              defined_by, retain_defined_by, versioned_defined_by,
+                              preloaded) is not None:
+            serialize_to_stream(g, output, output_format)
+    finally:
+        if store_dir:
+            if g is not None:
+                g.close()
+            shutil.rmtree(store_dir, ignore_errors=True)
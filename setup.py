@@ -18,7 +18,6 @@ setuptools.setup(
     install_requires=[
         'pyparsing',
         'rdflib==7.0.0',
-        'pydot',
         'jinja2',
         'markdown2',
         'pyyaml==5.2',
@@ -26,9 +25,14 @@ setuptools.setup(
         'SPARQLWrapper==1.8.4',
         'pyshacl==0.19.0'
     ],
+    extras_require={
+        'graphviz': ['pygraphviz']
+    },
     tests_require=[
         'pytest',
-        'pytest-cov'
+        'pytest-cov',
+        'pytest-xdist',
+        'pydot'
     ],
     classifiers=[
         "Development Status :: 5 - Production/Stable",
@@ -1,13 +1,10 @@
-from tempfile import TemporaryDirectory
-
 from onto_tool import onto_tool
 
 
-def test_missing_file_reported(caplog):
-    with TemporaryDirectory() as tempdir:
-        onto_tool.main([
-            'bundle', '-v', 'output', tempdir, 'tests/bundle/broken_file_ref.yaml'
-        ])
+def test_missing_file_reported(caplog, tmp_path):
+    onto_tool.main([
+        'bundle', '-v', 'output', f'{tmp_path}', 'tests/bundle/broken_file_ref.yaml'
+    ])
 
     logs = caplog.text
     assert 'missing_data.ttl' in logs
@@ -3,66 +3,26 @@ from rdflib.namespace import RDFS
 from onto_tool import onto_tool
 
 import pytest
-import os
 
-def lists_equal(list_one, list_two):
-    return len(list_one) == len(list_two) and sorted(list_one) == sorted(list_two)
+from ..helpers import bags_equal
 
+_ONTOLOGY = URIRef('https://data.clientX.com/d/ontoName')
+_PROPERTY = URIRef('https://data.clientX.com/myProperty')
+_INDIVIDUAL = URIRef('https://data.clientX.com/MyIndividual')
 
-@pytest.fixture(autouse=True)
-def cleanup():
-    yield
-    # os.remove('tests/bundle/issue-138-output.ttl')
 
-
-def test_bundle_no_defined_by():
-    onto_tool.main([
-        'bundle',
-        'tests/bundle/issue-138_no_mode.yaml'])
-    graph = Graph()
-    graph.parse('tests/bundle/issue-138-output.ttl', format="turtle")
-    assert len(graph) == 7
-    assert lists_equal(
-        list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/myProperty'), URIRef('https://data.clientX.com/d/ontoName'))]
-    )
-
-
-def test_bundle_strict_defined_by():
-    onto_tool.main([
-        'bundle',
-        'tests/bundle/issue-138_strict_mode.yaml'])
-    graph = Graph()
-    graph.parse('tests/bundle/issue-138-output.ttl', format="turtle")
-    assert len(graph) == 7
-    assert lists_equal(
-        list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/myProperty'), URIRef('https://data.clientX.com/d/ontoName'))]
-    )
-
-
-def test_bundle_all_defined_by():
-    onto_tool.main([
-        'bundle',
-        'tests/bundle/issue-138_all_mode.yaml'])
-    graph = Graph()
-    graph.parse('tests/bundle/issue-138-output.ttl', format="turtle")
-    assert len(graph) == 8
-    assert lists_equal(
-        list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/MyIndividual'), URIRef('https://data.clientX.com/d/ontoName')),
-         (URIRef('https://data.clientX.com/myProperty'), URIRef('https://data.clientX.com/d/ontoName'))]
-    )
-
-
-def test_bundle_versioned_defined_by():
+@pytest.mark.parametrize("bundle,count,expected", [
+    ('issue-138_no_mode.yaml', 7, [(_PROPERTY, _ONTOLOGY)]),
+    ('issue-138_strict_mode.yaml', 7, [(_PROPERTY, _ONTOLOGY)]),
+    ('issue-138_all_mode.yaml', 8, [(_INDIVIDUAL, _ONTOLOGY), (_PROPERTY, _ONTOLOGY)]),
+    ('issue-138_versioned_iri.yaml', 7,
+     [(_PROPERTY, URIRef('https://data.clientX.com/d/ontoName1.0.0'))]),
+])
+def test_bundle_defined_by(bundle, count, expected, tmp_path):
     onto_tool.main([
-        'bundle',
-        'tests/bundle/issue-138_versioned_iri.yaml'])
+        'bundle', '-v', 'output', f'{tmp_path}',
+        f'tests/bundle/{bundle}'])
     graph = Graph()
-    graph.parse('tests/bundle/issue-138-output.ttl', format="turtle")
-    assert len(graph) == 7
-    assert lists_equal(
-        list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/myProperty'), URIRef('https://data.clientX.com/d/ontoName1.0.0'))]
-    )
\ No newline at end of file
+    graph.parse(f'{tmp_path}/issue-138-output.ttl', format="turtle")
+    assert len(graph) == count
+    assert bags_equal(list(graph.subject_objects(RDFS.isDefinedBy)), expected)
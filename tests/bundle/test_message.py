@@ -1,15 +1,13 @@
 import logging
-from re import search
 
 from onto_tool import onto_tool
 
 
 def test_action_message(caplog, tmp_path):
-    caplog.set_level(logging.INFO)
-    onto_tool.main([
-        'bundle', '-v', 'output', f'{tmp_path}', 'tests/bundle/message.yaml'
-    ])
-
-    logs = caplog.text
-    print(logs)
-    assert search(r'INFO.*Test SPARQL Query from tests', logs)
+    with caplog.at_level(logging.INFO):
+        onto_tool.main([
+            'bundle', '-v', 'output', f'{tmp_path}', 'tests/bundle/message.yaml'
+        ])
+
+    assert any(record.levelno == logging.INFO and 'Test SPARQL Query from tests' in record.getMessage()
+               for record in caplog.records)
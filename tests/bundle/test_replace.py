@@ -0,0 +1,39 @@
+import stat
+
+import pytest
+
+from onto_tool import bundle
+
+
+def test_replace_changed(tmp_path):
+    target = tmp_path / 'data.ttl'
+    target.write_text('owl:versionInfo "1.0.0" .\n', encoding='utf-8')
+    target.chmod(0o640)
+    bundle.replace_patterns_in_file(str(target), r'\d+\.\d+\.\d+', '2.0.0')
+    assert target.read_text(encoding='utf-8') == 'owl:versionInfo "2.0.0" .\n'
+    assert stat.S_IMODE(target.stat().st_mode) == 0o640
+    assert list(tmp_path.iterdir()) == [target]
+
+
+def test_replace_unchanged(tmp_path):
+    target = tmp_path / 'data.ttl'
+    target.write_text('owl:versionInfo "latest" .\n', encoding='utf-8')
+    before = target.stat()
+    bundle.replace_patterns_in_file(str(target), r'\d+\.\d+\.\d+', '2.0.0')
+    after = target.stat()
+    # Not rewritten, so neither replaced nor touched
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert list(tmp_path.iterdir()) == [target]
+
+
+def test_replace_failure_removes_temporary_file(tmp_path, monkeypatch):
+    target = tmp_path / 'data.ttl'
+    target.write_text('owl:versionInfo "1.0.0" .\n', encoding='utf-8')
+
+    def fail_copymode(*_):
+        raise OSError('copymode failed')
+    monkeypatch.setattr(bundle.shutil, 'copymode', fail_copymode)
+    with pytest.raises(OSError):
+        bundle.replace_patterns_in_file(str(target), r'\d+\.\d+\.\d+', '2.0.0')
+    assert target.read_text(encoding='utf-8') == 'owl:versionInfo "1.0.0" .\n'
+    assert list(tmp_path.iterdir()) == [target]
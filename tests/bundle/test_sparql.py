@@ -3,9 +3,28 @@ import csv
 from rdflib import Graph, URIRef, Literal
 from rdflib.namespace import RDFS, SKOS
 
+from ..helpers import bags_equal
 
-def lists_equal(list_one, list_two):
-    return len(list_one) == len(list_two) and sorted(list_one) == sorted(list_two)
+_EXPECTED_QUERY_ROWS = (
+    {'s': 'https://data.clientX.com/d/topOntology',
+     'p': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type',
+     'o': 'http://www.w3.org/2002/07/owl#Ontology'},
+    {'s': 'https://data.clientX.com/d/topOntology',
+     'p': 'http://www.w3.org/2000/01/rdf-schema#definedBy',
+     'o': 'urn:test-sparql-queries'}
+)
+_EXPECTED_UPDATE_ROWS = (
+    {'person': 'http://example.com/John',
+     'name': 'John'},
+    {'person': 'http://example.com/Jane',
+     'name': 'Jane'},
+)
+_EXPECTED_UPDATE_LABELS = (
+    (URIRef('http://example.com/John'), Literal('John Johnson')),
+    (URIRef('http://example.com/Jane'), Literal('Jane Johnson'))
+)
+_EXPECTED_UPPER_LABELS = ("Person", "Upper Ontology", "has phone number", "is friend of", "is private")
+_EXPECTED_DOMAIN_LABELS = ("Domain Ontology", "School", "Student", "Teacher", "teaches", "works for")
 
 
 def test_sparql_queries(tmp_path):
@@ -13,16 +32,8 @@ def test_sparql_queries(tmp_path):
         'bundle', '-v', 'output', f'{tmp_path}', 'tests/bundle/sparql.yaml'
     ])
     with open(f'{tmp_path}/sparql.csv') as csvfile:
-        actual = list(row for row in csv.DictReader(csvfile))
-    expected = [
-        {'s': 'https://data.clientX.com/d/topOntology',
-         'p': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type',
-         'o': 'http://www.w3.org/2002/07/owl#Ontology'},
-        {'s': 'https://data.clientX.com/d/topOntology',
-         'p': 'http://www.w3.org/2000/01/rdf-schema#definedBy',
-         'o': 'urn:test-sparql-queries'}
-    ]
-    assert actual == expected
+        actual = tuple(csv.DictReader(csvfile))
+    assert actual == _EXPECTED_QUERY_ROWS
 
 
 def test_sparql_updates(tmp_path):
@@ -31,21 +42,13 @@ def test_sparql_updates(tmp_path):
     ])
 
     with open(f'{tmp_path}/sparql_update_select.csv') as csvfile:
-        actual = list(row for row in csv.DictReader(csvfile))
-    expected = [
-        {'person': 'http://example.com/John',
-         'name': 'John'},
-        {'person': 'http://example.com/Jane',
-         'name': 'Jane'},
-    ]
-    assert actual == expected
+        actual = tuple(csv.DictReader(csvfile))
+    assert actual == _EXPECTED_UPDATE_ROWS
 
     constructed_graph = Graph()
     constructed_graph.parse(f'{tmp_path}/sparql_update_construct.xml', format='xml')
     labels = list(constructed_graph.subject_objects(SKOS.prefLabel))
-    assert lists_equal([(URIRef('http://example.com/John'), Literal('John Johnson')),
-                        (URIRef('http://example.com/Jane'), Literal('Jane Johnson'))],
-                       labels)
+    assert bags_equal(_EXPECTED_UPDATE_LABELS, labels)
 
 
 def test_each_file(tmp_path):
@@ -65,16 +68,13 @@ def test_each_file(tmp_path):
 
     # Verify SELECT
     with open(f'{tmp_path}/each/select/upper_ontology.csv') as csvfile:
-        actual = list(row['label'] for row in csv.DictReader(csvfile))
-    expected = ["Person", "Upper Ontology", "has phone number", "is friend of", "is private"]
-    assert actual == expected
+        actual = tuple(row['label'] for row in csv.DictReader(csvfile))
+    assert actual == _EXPECTED_UPPER_LABELS
     with open(f'{tmp_path}/each/select/domain_ontology.csv') as csvfile:
-        actual = list(row['label'] for row in csv.DictReader(csvfile))
-    expected = ["Domain Ontology", "School", "Student", "Teacher", "teaches", "works for"]
-    assert actual == expected
+        actual = tuple(row['label'] for row in csv.DictReader(csvfile))
+    assert actual == _EXPECTED_DOMAIN_LABELS
 
     # Verify UPDATE
-    assert actual == expected
     constructed_graph = Graph()
     constructed_graph.parse(f'{tmp_path}/each/update/upper_ontology.ttl', format='turtle')
     labels = list(constructed_graph.subject_objects(SKOS.prefLabel))
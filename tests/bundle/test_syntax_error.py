@@ -2,6 +2,8 @@ from onto_tool import onto_tool
 from pytest import raises
 import re
 
+_PARSE_ERROR_RE = re.compile(r'Error parsing .*malformed_rdf.ttl at 3', re.ASCII)
+
 
 def test_syntax_export(caplog, tmp_path):
     with raises(SystemExit) as wrapped_exit:
@@ -12,4 +14,4 @@ def test_syntax_export(caplog, tmp_path):
     assert wrapped_exit.value.code == 1
 
     logs = caplog.text
-    assert re.search(r'Error parsing .*malformed_rdf.ttl at 3', logs)
+    assert _PARSE_ERROR_RE.search(logs)
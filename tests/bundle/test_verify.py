@@ -20,7 +20,7 @@ def test_verify_select(caplog, tmp_path):
     assert 'http://example.com/unlabeled' in logs
 
     with open(f'{tmp_path}/verify_select_errors.csv') as errors:
-        actual = list(row for row in csv.DictReader(errors))
+        actual = list(csv.DictReader(errors))
     expected = [{'unlabeled': 'http://example.com/unlabeled'}]
     assert actual == expected
 
@@ -51,12 +51,12 @@ def test_verify_select_multiple(caplog, tmp_path):
     assert 'http://example.com/nonexistent' in logs
 
     with open(f'{tmp_path}/verify_select_results/verify_label_select_query.csv') as errors:
-        actual = list(row for row in csv.DictReader(errors))
+        actual = list(csv.DictReader(errors))
     expected = [{'unlabeled': 'http://example.com/unlabeled'}]
     assert actual == expected
 
     with open(f'{tmp_path}/verify_select_results/verify_domain_select_query.csv') as errors:
-        actual = list(row for row in csv.DictReader(errors))
+        actual = list(csv.DictReader(errors))
     expected = [{'domain': 'http://example.com/nonexistent'}]
     assert actual == expected
 
@@ -0,0 +1,20 @@
+import pytest
+from rdflib import Graph
+
+# Inputs shared by the update and export tests
+_SHARED_INPUTS = (
+    'tests/update-tests.ttl',
+    'tests/merge-subdomain.ttl',
+    'tests/merge-top.ttl',
+    'tests/issue-36-defined-by.ttl',
+)
+
+
+@pytest.fixture(scope="session")
+def input_graphs():
+    """Parse the shared test inputs once, for onto_tool.main(preloaded_graphs=...)."""
+    graphs = {}
+    for path in _SHARED_INPUTS:
+        graphs[path] = Graph()
+        graphs[path].parse(path, format="turtle")
+    return graphs
@@ -26,7 +26,7 @@ def test_show_bnode_subjects(tmp_path):
         'tests/graphic/issue-116-ontology.ttl'
     ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_show_bnode_subjects.dot')
-    edges = list(sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges())
     assert edges == [('"http://example.org/Person"', '"http://example.org/State"')]
 
 
@@ -40,7 +40,7 @@ def test_show_named_subjects(tmp_path):
         'tests/graphic/issue-116-named-subjects.ttl',
     ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_named_subjects.dot')
-    edges = list(sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges())
     assert edges == [('"http://example.org/Person"', '"http://example.org/State"')]
 
 
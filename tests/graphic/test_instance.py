@@ -14,7 +14,7 @@ def test_local_instance(tmp_path):
         'tests/graphic/instance_data.ttl'
     ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_instance.dot')
-    edges = list(sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges())
     assert edges == [
         ('"http://example.com/Student"', '"http://example.com/Person"'),
         ('"http://example.com/Teacher"', '"http://example.com/School"'),
@@ -31,7 +31,7 @@ def test_multi_language(tmp_path):
         'tests/graphic/multi_language.ttl'
     ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_multi_lingual_en.dot')
-    edges = list(sorted((e.get_source(), e.get_label(), e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_label(), e.get_destination()) for e in instance_graph.get_edges())
     assert edges == [
         ('"http://example.com/Person"', 'likes', '"http://example.com/Dessert"')
     ]
@@ -44,7 +44,7 @@ def test_multi_language(tmp_path):
         'tests/graphic/multi_language.ttl'
     ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_multi_lingual_fr.dot')
-    edges = list(sorted((e.get_source(), e.get_label(), e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_label(), e.get_destination()) for e in instance_graph.get_edges())
     assert edges == [
         ('"http://example.com/Person"', 'aime', '"http://example.com/Dessert"')
     ]
@@ -59,7 +59,7 @@ def test_inheritance(tmp_path):
                        'tests/graphic/inheritance_hierarchy.ttl'
                    ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_inheritance.dot')
-    edges = list(sorted((e.get_source(), e.get_label() or '', e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_label() or '', e.get_destination()) for e in instance_graph.get_edges())
     assert edges == [
         ('"http://example.org/Person"', 'memberOf', '"http://example.org/Organization"'),
         ('"http://example.org/Professor"', '', '"http://example.org/Person"'),
@@ -121,7 +121,7 @@ def test_shacl_instances(tmp_path):
         'tests/graphic/instance_data.ttl'
     ])
     (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_instance.dot')
-    edges = list(sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges()))
+    edges = sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges())
     shacl_namespace = "http://www.w3.org/ns/shacl#"
     shacl_edges = [edge for edge in edges if any(shacl_namespace in part for part in edge)]
     assert 0 == len(shacl_edges)
@@ -1,20 +1,199 @@
-from onto_tool import onto_tool
-import pydot
+import json
+import os
+import re
+import shutil
+from collections import OrderedDict
 
+import pytest
+from rdflib import Graph
 
-def test_local_instance(tmp_path):
-    onto_tool.main([
+from onto_tool import onto_tool, ontograph
+from onto_tool.utils import nt_cache_path, parse_rdf_nt_cached
+
+from ..helpers import parse_command
+
+# Edge statements as written by OntoGraf: ``source -> target [attributes];``
+_DOT_EDGE_RE = re.compile(r'^\s*("(?:[^"\\]|\\.)*"|[\w.]+)\s*->\s*("(?:[^"\\]|\\.)*"|[\w.]+)',
+                          re.MULTILINE)
+
+# Appended to an N-Triples copy to tell whether it was parsed
+_EXTRA_TRIPLE = '<urn:test:s> <urn:test:p> <urn:test:o> .\n'
+
+
+def dot_edges(dot_text):
+    """Return the sorted (source, target) pairs of the edges in DOT text."""
+    return sorted(_DOT_EDGE_RE.findall(dot_text))
+
+
+def test_local_instance():
+    dot = onto_tool.graphic_dot(parse_command([
         'graphic',
         '-t', 'Local Ontology',
         '--no-image',
-        '-o', f'{tmp_path}/test_schema',
         'tests/graphic/domain_ontology.ttl',
         'tests/graphic/upper_ontology.ttl',
         'tests/graphic/instance_data.ttl'
-    ])
-    (instance_graph,) = pydot.graph_from_dot_file(f'{tmp_path}/test_schema.dot')
-    edges = list(sorted((e.get_source(), e.get_destination()) for e in instance_graph.get_edges()))
-    assert edges == [
+    ]))
+    assert dot_edges(dot) == [
         ('Domain', 'Upper'),
         ('Instances', 'Domain')
     ]
+
+
+def test_schema_info_cache_bounded(monkeypatch):
+    monkeypatch.setattr(ontograph, '_SCHEMA_INFO_CACHE', OrderedDict())
+    monkeypatch.setattr(ontograph, '_SCHEMA_INFO_CACHE_SIZE', 1)
+    dot = onto_tool.graphic_dot(parse_command([
+        'graphic',
+        '--no-image',
+        'tests/graphic/domain_ontology.ttl',
+        'tests/graphic/upper_ontology.ttl'
+    ]))
+    assert dot_edges(dot) == [('Domain', 'Upper')]
+    assert len(ontograph._SCHEMA_INFO_CACHE) == 1
+
+
+def test_nt_cache(tmp_path, monkeypatch):
+    inputs = tmp_path / 'ontologies'
+    inputs.mkdir()
+    for name in ('domain_ontology.ttl', 'upper_ontology.ttl'):
+        shutil.copy(f'tests/graphic/{name}', inputs)
+    args = [
+        'graphic',
+        '-t', 'Local Ontology',
+        '--no-image',
+        '--nt-cache',
+        '-o', f'{tmp_path}/test_schema',
+        f'{inputs}/*'
+    ]
+    # The second run must not pick up N-Triples copies as extra inputs
+    for _ in range(2):
+        monkeypatch.setattr(ontograph, '_SCHEMA_INFO_CACHE', OrderedDict())
+        onto_tool.main(args)
+        assert dot_edges((tmp_path / 'test_schema.dot').read_text(encoding='utf-8')) == [('Domain', 'Upper')]
+        assert sorted(path.name for path in inputs.iterdir()) == ['domain_ontology.ttl', 'upper_ontology.ttl']
+    assert len(list((tmp_path / '.ontograf-nt-cache').glob('*.nt'))) == 2
+
+
+def test_nt_cache_copy(tmp_path):
+    shutil.copy('tests/graphic/domain_ontology.ttl', tmp_path)
+    source = str(tmp_path / 'domain_ontology.ttl')
+    cache_dir = str(tmp_path / 'cache')
+    copy = nt_cache_path(source, cache_dir)
+    expected = Graph()
+    parse_rdf_nt_cached(expected, source, cache_dir)
+    assert os.path.exists(copy)
+
+    # An up to date copy is parsed instead of the source
+    with open(copy, 'a', encoding='utf-8') as copy_file:
+        copy_file.write(_EXTRA_TRIPLE)
+    cached = Graph()
+    parse_rdf_nt_cached(cached, source, cache_dir)
+    assert len(cached) == len(expected) + 1
+
+    # A source newer than its copy regenerates it
+    copy_mtime = os.stat(copy).st_mtime_ns
+    os.utime(source, ns=(copy_mtime, copy_mtime + 1_000_000_000))
+    regenerated = Graph()
+    parse_rdf_nt_cached(regenerated, source, cache_dir)
+    assert len(regenerated) == len(expected)
+    with open(copy, encoding='utf-8') as copy_file:
+        assert _EXTRA_TRIPLE not in copy_file.read()
+
+
+def test_nt_cache_unwritable(tmp_path, caplog):
+    # A cache directory below a regular file cannot be created
+    (tmp_path / 'not_a_directory').write_text('', encoding='utf-8')
+    graph = Graph()
+    parse_rdf_nt_cached(graph, 'tests/graphic/domain_ontology.ttl',
+                        str(tmp_path / 'not_a_directory' / 'cache'))
+    assert len(graph) > 0
+    assert 'Unable to save N-Triples cache' in caplog.text
+
+
+def _tamper_schema_cache(cache_path, filename):
+    """Replace the cached class list of filename, to tell whether the cache was used."""
+    with open(cache_path, encoding='utf-8') as cache_file:
+        cached = json.load(cache_file)
+    for cached_filename, file_data in cached['entries'].values():
+        if cached_filename == filename:
+            file_data['classesList'] = 'TamperedClass'
+    with open(cache_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(cached, cache_file)
+
+
+def test_schema_cache(tmp_path, monkeypatch):
+    for name in ('domain_ontology.ttl', 'upper_ontology.ttl'):
+        shutil.copy(f'tests/graphic/{name}', tmp_path)
+    domain = tmp_path / 'domain_ontology.ttl'
+    cache_path = tmp_path / '.ontograf-cache.json'
+    args = [
+        'graphic',
+        '-t', 'Local Ontology',
+        '--no-image',
+        '-o', f'{tmp_path}',
+        str(domain),
+        str(tmp_path / 'upper_ontology.ttl')
+    ]
+
+    def render():
+        # Bypass the in-process cache so that only the file cache is involved
+        monkeypatch.setattr(ontograph, '_SCHEMA_INFO_CACHE', OrderedDict())
+        return onto_tool.graphic_dot(parse_command(['graphic', '--schema-cache'] + args[1:]))
+
+    # Off unless requested
+    onto_tool.main(args)
+    assert not cache_path.exists()
+
+    monkeypatch.setattr(ontograph, '_SCHEMA_INFO_CACHE', OrderedDict())
+    onto_tool.main(['graphic', '--schema-cache'] + args[1:])
+    with open(cache_path, encoding='utf-8') as cache_file:
+        cached = json.load(cache_file)
+    assert cached['format'] == ontograph._SCHEMA_CACHE_FORMAT
+    assert sorted(filename for filename, _ in cached['entries'].values()) == [
+        'domain_ontology.ttl', 'upper_ontology.ttl'
+    ]
+
+    # Entries for unchanged files are reused
+    _tamper_schema_cache(cache_path, 'domain_ontology.ttl')
+    assert 'TamperedClass' in render()
+
+    # A different modification time invalidates the entry
+    stat = domain.stat()
+    os.utime(domain, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert 'TamperedClass' not in render()
+
+    # So does a different size, even with the original modification time
+    with open(domain, 'a', encoding='utf-8') as domain_file:
+        domain_file.write('\n')
+    os.utime(domain, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert 'TamperedClass' not in render()
+
+
+@pytest.mark.parametrize("content", [
+    {'format': 'another version', 'entries': {}},
+    {'format': ontograph._SCHEMA_CACHE_FORMAT, 'entries': {'key': 5}},
+    {'format': ontograph._SCHEMA_CACHE_FORMAT, 'entries': {'key': ['file.ttl', {'ontology': 'x'}]}},
+    ['not', 'a', 'cache'],
+])
+def test_schema_cache_ignores_invalid(content, tmp_path):
+    with open(tmp_path / '.ontograf-cache.json', 'w', encoding='utf-8') as cache_file:
+        json.dump(content, cache_file)
+    onto_tool.main([
+        'graphic',
+        '--no-image',
+        '--schema-cache',
+        '-o', f'{tmp_path}',
+        'tests/graphic/domain_ontology.ttl',
+        'tests/graphic/upper_ontology.ttl'
+    ])
+    with open(tmp_path / '.ontograf-cache.json', encoding='utf-8') as cache_file:
+        cached = json.load(cache_file)
+    assert cached['format'] == ontograph._SCHEMA_CACHE_FORMAT
+    assert len(cached['entries']) == 2
+
+
+def test_strip_uri_warns_every_time(caplog):
+    for _ in range(2):
+        assert ontograph._strip_uri('https://data.clientX.com/1.0.0') == 'https://data.clientX.com/1.0.0'
+    assert caplog.text.count('went horribly wrong') == 2
@@ -0,0 +1,14 @@
+"""Helpers shared by the test modules."""
+from collections import Counter
+
+from onto_tool.command_line import configure_arg_parser
+
+
+def parse_command(arguments):
+    """Parse an onto_tool command line for update_graphs/export_graph."""
+    return configure_arg_parser().parse_args(args=arguments)
+
+
+def bags_equal(bag_one, bag_two):
+    """Compare two iterables of hashable items (nodes or node tuples) as multisets."""
+    return Counter(bag_one) == Counter(bag_two)
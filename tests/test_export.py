@@ -1,76 +1,166 @@
+import io
+import logging
+import tempfile
+
+import pytest
 from rdflib import Graph, URIRef, Literal
+from rdflib.compare import isomorphic
 from rdflib.namespace import OWL, XSD, RDF, RDFS
 from onto_tool import onto_tool
+from onto_tool.utils import serialize_to_stream
 
+from .helpers import bags_equal, parse_command
 
-def lists_equal(list_one, list_two):
-    return len(list_one) == len(list_two) and sorted(list_one) == sorted(list_two)
+_ONTOLOGY = URIRef('https://data.clientX.com/d/ontoName')
+_CORE = URIRef('https://data.clientX.com/d/coreOntology')
+_CORE_V2 = URIRef('https://data.clientX.com/d/coreOntology2.0.0')
+_EXTERNAL_V1_3 = URIRef('https://come.external.com/ontology1.3.0')
+_PROPERTY = URIRef('https://data.clientX.com/myProperty')
+_MERGE_COMMENT = Literal('Created by merge tool.', datatype=XSD.string)
 
 
-def test_export_strip_versions(capsys):
+def test_export_strip_versions(capsys, input_graphs):
     onto_tool.main([
-        'export', '-s',
+        'export', '-f', 'nt', '-s',
         'tests/update-tests.ttl'
-    ])
+    ], preloaded_graphs=input_graphs)
     updated = capsys.readouterr().out
     graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert lists_equal(
+    graph.parse(data=updated, format="nt")
+    assert bags_equal(
         list(graph.subject_objects(OWL.imports)),
-        [(URIRef('https://data.clientX.com/d/ontoName'),
-          URIRef('https://data.clientX.com/d/coreOntology'))]
+        [(_ONTOLOGY, _CORE)]
     )
 
 
-def test_export_merge(capsys):
-    onto_tool.main([
+@pytest.mark.parametrize("store", ['SimpleMemory', 'BerkeleyDB'])
+def test_export_store(store, capsys):
+    if store == 'BerkeleyDB':
+        pytest.importorskip('berkeleydb')
+    inputs = ['tests/merge-subdomain.ttl', 'tests/merge-top.ttl']
+    onto_tool.main(['export', '-f', 'nt'] + inputs)
+    in_memory = Graph().parse(data=capsys.readouterr().out, format='nt')
+    onto_tool.main(['export', '-f', 'nt', '-S', store] + inputs)
+    stored = Graph().parse(data=capsys.readouterr().out, format='nt')
+    assert len(stored) > 0
+    assert isomorphic(stored, in_memory)
+
+
+def test_export_unknown_store(caplog, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    with pytest.raises(SystemExit) as wrapped_exit:
+        onto_tool.main(['export', '-S', 'NoSuchStore', 'tests/merge-top.ttl'])
+    assert wrapped_exit.value.code == 1
+    assert 'Cannot use store NoSuchStore' in caplog.text
+    assert not list(tmp_path.iterdir())
+
+
+def test_export_graph_rejects_store():
+    with pytest.raises(ValueError):
+        onto_tool.export_graph(parse_command(['export', '-S', 'SimpleMemory', 'tests/merge-top.ttl']))
+
+
+def test_export_merge(input_graphs):
+    graph = onto_tool.export_graph(parse_command([
         'export',
         '-m', 'https://data.clientX.com/d/coreOntology', '2.0.0',
         '-b', 'strict',
         'tests/merge-subdomain.ttl', 'tests/merge-top.ttl'
-    ])
-    updated = capsys.readouterr().out
-    graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert lists_equal(
+    ]), input_graphs)
+    assert bags_equal(
         list(graph.subjects(RDF.type, OWL.Ontology)),
-        [URIRef('https://data.clientX.com/d/coreOntology')]
+        [_CORE]
     )
-    assert lists_equal(
+    assert bags_equal(
         list(graph.subject_objects(OWL.imports)),
-        [(URIRef('https://data.clientX.com/d/coreOntology'),
-          URIRef('https://come.external.com/ontology1.3.0'))]
+        [(_CORE, _EXTERNAL_V1_3)]
     )
-    assert lists_equal(
+    assert bags_equal(
         list(graph.subject_objects(OWL.versionIRI)),
-        [(URIRef('https://data.clientX.com/d/coreOntology'),
-          URIRef('https://data.clientX.com/d/coreOntology2.0.0'))]
+        [(_CORE, _CORE_V2)]
     )
-    assert lists_equal(
+    assert bags_equal(
         list(graph.subject_objects(OWL.versionInfo)),
-        [(URIRef('https://data.clientX.com/d/coreOntology'),
-          Literal('Created by merge tool.', datatype=XSD.string))]
+        [(_CORE, _MERGE_COMMENT)]
     )
-    assert lists_equal(
+    assert bags_equal(
         list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/myProperty'),
-          URIRef('https://data.clientX.com/d/coreOntology'))]
+        [(_PROPERTY, _CORE)]
     )
 
 
-def test_versioned_defined_by(capsys):
-    onto_tool.main([
+def test_versioned_defined_by(input_graphs):
+    graph = onto_tool.export_graph(parse_command([
         'export',
         '-m', 'https://data.clientX.com/d/coreOntology', '2.0.0',
         '-b', 'strict',
         '--versioned-definedBy',
         'tests/merge-subdomain.ttl', 'tests/merge-top.ttl'
-    ])
-    updated = capsys.readouterr().out
-    graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert lists_equal(
+    ]), input_graphs)
+    assert bags_equal(
         list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/myProperty'),
-          URIRef('https://data.clientX.com/d/coreOntology2.0.0'))]
+        [(_PROPERTY, _CORE_V2)]
+    )
+
+
+def test_export_skips_duplicate_files(caplog, input_graphs):
+    caplog.set_level(logging.DEBUG)
+    graph = onto_tool.export_graph(parse_command([
+        'export', '-s',
+        'tests/update-tests.ttl', 'tests/update-tests.ttl'
+    ]), input_graphs)
+    assert bags_equal(
+        list(graph.subject_objects(OWL.imports)),
+        [(_ONTOLOGY, _CORE)]
     )
+    assert 'Skipping tests/update-tests.ttl, same file as tests/update-tests.ttl' in caplog.text
+
+
+def test_export_keeps_identical_copies(tmp_path):
+    # Each parse mints its own blank nodes, so copies of a file are not redundant
+    for name in ('one.ttl', 'two.ttl'):
+        (tmp_path / name).write_text('[] a <http://example.com/Thing> .\n', encoding='utf-8')
+    graph = onto_tool.export_graph(parse_command([
+        'export',
+        f'{tmp_path}/one.ttl', f'{tmp_path}/two.ttl', f'{tmp_path}/./one.ttl'
+    ]))
+    assert len(graph) == 2
+
+
+def test_export_keeps_argument_order(tmp_path):
+    (tmp_path / 'one.ttl').write_text(
+        '@prefix one: <http://example.com/one#> .\none:a one:p one:b .\n', encoding='utf-8')
+    (tmp_path / 'two.rdf').write_text(
+        '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n'
+        '         xmlns:ord="http://example.com/two#">\n'
+        '  <rdf:Description rdf:about="http://example.com/two#a">\n'
+        '    <ord:p rdf:resource="http://example.com/two#b"/>\n'
+        '  </rdf:Description>\n'
+        '</rdf:RDF>\n', encoding='utf-8')
+    (tmp_path / 'three.ttl').write_text(
+        '@prefix ord: <http://example.com/three#> .\nord:a ord:p ord:b .\n', encoding='utf-8')
+    graph = onto_tool.export_graph(parse_command([
+        'export',
+        f'{tmp_path}/one.ttl', f'{tmp_path}/two.rdf', f'{tmp_path}/three.ttl'
+    ]))
+    assert len(graph) == 3
+    # The first file to bind a prefix wins
+    assert str(dict(graph.namespaces())['ord']) == 'http://example.com/two#'
+
+
+def _labelled_graph():
+    graph = Graph()
+    graph.add((URIRef('http://example.com/a'), RDFS.label, Literal('caf\u00e9')))
+    return graph
+
+
+def test_serialize_utf8_stream():
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+    serialize_to_stream(_labelled_graph(), stream, 'turtle')
+    assert '"caf\u00e9"' in stream.buffer.getvalue().decode('utf-8')
+
+
+def test_serialize_non_utf8_stream_fails_loudly():
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='ascii')
+    with pytest.raises(UnicodeEncodeError):
+        serialize_to_stream(_labelled_graph(), stream, 'turtle')
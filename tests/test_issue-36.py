@@ -1,50 +1,23 @@
-from rdflib import Graph, URIRef
+from rdflib import URIRef
 from rdflib.namespace import RDFS
 from onto_tool import onto_tool
 
+import pytest
 
-def lists_equal(list_one, list_two):
-    return len(list_one) == len(list_two) and sorted(list_one) == sorted(list_two)
+from .helpers import bags_equal, parse_command
 
+_ONTOLOGY = URIRef('https://data.clientX.com/d/ontoName')
+_PROPERTY = URIRef('https://data.clientX.com/myProperty')
+_INDIVIDUAL = URIRef('https://data.clientX.com/MyIndividual')
 
-def test_update_no_defined_by(capsys):
-    onto_tool.main([
-        'update',
-        'tests/issue-36-defined-by.ttl'])
-    updated = capsys.readouterr().out
-    graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert len(graph) == 5
-    assert len(list(graph.subject_objects(RDFS.isDefinedBy))) == 0
 
-
-def test_update_strict_defined_by(capsys):
-    capsys.readouterr()
-    onto_tool.main([
-        'update',
-        '-b', 'strict',
-        'tests/issue-36-defined-by.ttl'])
-    updated = capsys.readouterr().out
-    graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert len(graph) == 6
-    assert lists_equal(
-        list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/myProperty'), URIRef('https://data.clientX.com/d/ontoName'))]
-    )
-
-
-def test_update_all_defined_by(capsys):
-    onto_tool.main([
-        'update',
-        '-b', 'all',
-        'tests/issue-36-defined-by.ttl'])
-    updated = capsys.readouterr().out
-    graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert len(graph) == 7
-    assert lists_equal(
-        list(graph.subject_objects(RDFS.isDefinedBy)),
-        [(URIRef('https://data.clientX.com/MyIndividual'), URIRef('https://data.clientX.com/d/ontoName')),
-         (URIRef('https://data.clientX.com/myProperty'), URIRef('https://data.clientX.com/d/ontoName'))]
-    )
+@pytest.mark.parametrize("mode,count,expected", [
+    ([], 5, []),
+    (['-b', 'strict'], 6, [(_PROPERTY, _ONTOLOGY)]),
+    (['-b', 'all'], 7, [(_INDIVIDUAL, _ONTOLOGY), (_PROPERTY, _ONTOLOGY)]),
+])
+def test_update_defined_by(mode, count, expected, input_graphs):
+    [(_, _, graph)] = onto_tool.update_graphs(parse_command(
+        ['update'] + mode + ['tests/issue-36-defined-by.ttl']), input_graphs)
+    assert len(graph) == count
+    assert bags_equal(graph.subject_objects(RDFS.isDefinedBy), expected)
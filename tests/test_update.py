@@ -2,44 +2,55 @@ from rdflib import Graph, URIRef, Literal
 from rdflib.namespace import OWL, XSD
 from onto_tool import onto_tool
 
+from .helpers import bags_equal, parse_command
 
-def lists_equal(list_one, list_two):
-    return len(list_one) == len(list_two) and sorted(list_one) == sorted(list_two)
+_ONTOLOGY = URIRef('https://data.clientX.com/d/ontoName')
+_ONTOLOGY_V2 = URIRef('https://data.clientX.com/d/ontoName2.0.0')
+_CORE_V2 = URIRef('https://data.clientX.com/d/coreOntology2.0.0')
+_OTHER_V1 = URIRef('https://data.clientX.com/d/otherOntology1.0.0')
+_RELEASE_INFO = Literal('Release 2.0.0', datatype=XSD.string)
 
 
-def test_update_version(capsys):
+def test_update_version(capsys, input_graphs):
     onto_tool.main([
-        'update',
+        'update', '-f', 'nt',
         '-v', '2.0.0',
         '--version-info', "Release 2.0.0",
         'tests/update-tests.ttl'
-    ])
+    ], preloaded_graphs=input_graphs)
     updated = capsys.readouterr().out
     graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert lists_equal(
+    graph.parse(data=updated, format="nt")
+    assert bags_equal(
         list(graph.subject_objects(OWL.versionIRI)),
-        [(URIRef('https://data.clientX.com/d/ontoName'),
-          URIRef('https://data.clientX.com/d/ontoName2.0.0'))]
+        [(_ONTOLOGY, _ONTOLOGY_V2)]
     )
-    assert lists_equal(
+    assert bags_equal(
         list(graph.subject_objects(OWL.versionInfo)),
-        [(URIRef('https://data.clientX.com/d/ontoName'),
-          Literal('Release 2.0.0', datatype=XSD.string))]
+        [(_ONTOLOGY, _RELEASE_INFO)]
     )
 
 
-def test_update_dependency(capsys):
-    onto_tool.main([
+def test_update_dependency(input_graphs):
+    [(_, _, graph)] = onto_tool.update_graphs(parse_command([
         'update',
         '-d', 'https://data.clientX.com/d/coreOntology', '2.0.0',
         'tests/update-tests.ttl'
-    ])
-    updated = capsys.readouterr().out
-    graph = Graph()
-    graph.parse(data=updated, format="turtle")
-    assert lists_equal(
+    ]), input_graphs)
+    assert bags_equal(
+        list(graph.subject_objects(OWL.imports)),
+        [(_ONTOLOGY, _CORE_V2)]
+    )
+
+
+def test_update_multiple_dependencies(input_graphs):
+    [(_, _, graph)] = onto_tool.update_graphs(parse_command([
+        'update',
+        '-d', 'https://data.clientX.com/d/otherOntology', '1.0.0',
+        '-d', 'https://data.clientX.com/d/coreOntology', '2.0.0',
+        'tests/update-tests.ttl'
+    ]), input_graphs)
+    assert bags_equal(
         list(graph.subject_objects(OWL.imports)),
-        [(URIRef('https://data.clientX.com/d/ontoName'),
-          URIRef('https://data.clientX.com/d/coreOntology2.0.0'))]
+        [(_ONTOLOGY, _OTHER_V1), (_ONTOLOGY, _CORE_V2)]
     )